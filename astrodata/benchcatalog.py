@@ -0,0 +1,90 @@
+
+"""This script times reading star catalog pixels one after another, against reading them
+concurrently on the catalog thread pool, for increasing numbers of pixels, so the crossover
+point, where concurrent reads become faster, can be found for this host.
+
+Run it from the project directory, with the star catalog files in astrodata/dbases
+
+python3 astrodata/benchcatalog.py
+
+To use concurrent reads, set 'catalog_threads' in the _CONFIG dictionary of remscope_packages/cfg.py
+to the number of threads, and 'catalog_fanout_pixels' to the number of pixels at which the concurrent
+reads win. The threads used here are 'catalog_threads', or four if it is zero.
+"""
+
+import os, sys, time, random
+
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECTFILES = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, PROJECTFILES)
+
+from remscope_packages import cfg
+
+cfg.set_projectfiles(PROJECTFILES)
+
+from remscope_packages import stars
+
+
+# each timing is the best of this number of repeats
+REPEATS = 5
+
+# numbers of pixels read
+PIXELS = (1, 2, 3, 4, 6, 8, 12, 16, 32, 64)
+
+# (nside, magnitude limit) of the reads, a wide finder chart and a deep zoom
+LEVELS = ((8, 7.0), (128, 13.0))
+
+
+def best_time(function, pixels):
+    "Returns the best time in seconds of calling function on each of the pixels"
+    best = None
+    for repeat in range(REPEATS):
+        start = time.perf_counter()
+        function(pixels)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def compare(read, npix, pool):
+    "For each number of pixels, prints the time to read random pixels in turn, and concurrently"
+    print(f"{'pixels':>8} {'in turn ms':>12} {'concurrent ms':>14}")
+    crossover = None
+    for number in PIXELS:
+        pixels = random.sample(range(npix), number)
+        serial = best_time(lambda pixels: [read(hp) for hp in pixels], pixels)
+        concurrent = best_time(lambda pixels: list(pool.map(read, pixels)), pixels)
+        print(f"{number:>8} {serial*1000:>12.3f} {concurrent*1000:>14.3f}")
+        # the crossover is the fewest pixels from which the concurrent reads win at every number
+        if concurrent >= serial:
+            crossover = None
+        elif crossover is None:
+            crossover = number
+    if crossover is None:
+        print("Concurrent reads are not faster, leave 'catalog_threads' in cfg.py at 0\n")
+    else:
+        print(f"Concurrent reads are faster from {crossover} pixels, set 'catalog_fanout_pixels' in cfg.py to {crossover}\n")
+
+
+if __name__ == "__main__":
+
+    threads = cfg.catalog_threads() or 4
+    pool = ThreadPoolExecutor(max_workers=threads)
+    print(f"Using {threads} threads\n")
+
+    catalog = stars._star_catalog()
+    if catalog is not None:
+        for nside, mag_limit in LEVELS:
+            print(f"Columnar catalog, nside {nside}, magnitude limit {mag_limit}")
+            limit = int(round(mag_limit * 1000))
+            compare(lambda hp: catalog._read([hp], nside, limit), 12 * nside * nside, pool)
+
+    if os.path.isfile(stars._HP768):
+        print("Sqlite catalog HP768.db, magnitude limit 13.0")
+        compare(lambda hp: stars._read_database(stars._HP768, hp, 13.0), 768, pool)
+
+    if catalog is None and not os.path.isfile(stars._HP768):
+        print("No star catalog found")
+
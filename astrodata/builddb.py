@@ -2,18 +2,31 @@
 
 """
 Once the gsc files have been downloaded from https://cdsarc.unistra.fr/viz-bin/cat/I/254
-this python script can read through them and will create the following sqlite databases:
+this python script can read through them and will create the sqlite database:
 
-HP48.db - stars to magnitude 6
-HP192.db - stars to magnitude 9
-HP768.db - all stars
+GSC.db - all stars
 
-Each database has a single table 'stars" with columns (HP INTEGER, GSC_ID TEXT, RA REAL, DEC REAL, MAG REAL)
+This has a single table 'stars' with columns (HP INTEGER, MAG REAL, GSC_ID TEXT, RA REAL, DEC REAL)
+where HP is the index of the nside 128 nested healpix pixel containing the star. It is a
+WITHOUT ROWID table with primary key (HP, MAG, GSC_ID), so the rows are clustered by pixel, and
+within each pixel are sorted by magnitude, brightest first.
 
 The GSC_ID is not used by my chart, but is saved should there be a future need
 to cross-reference a star on the chart with the source material.
 
-HP is the healpix index containing the star
+Each star is held once. Since the pixels are nested, a pixel of any coarser nside is a
+contiguous run of nside 128 pixels, and the stars brighter than any magnitude limit are
+a prefix of each nside 128 pixel, so one catalog serves every view of the chart.
+
+The database also has a table 'manifest' with columns (PATH TEXT, REGION TEXT, ROWS INTEGER, CHECKSUM TEXT)
+recording each GSC file loaded, so an interrupted build can be restarted and will skip the files
+already done, and a corrected source file, having a changed checksum, replaces only its own region.
+
+Once the database is made, it is exported to a columnar form which the
+star chart memory maps, see create_columnar below.
+
+An installation which has only the older sqlite catalogs, downloaded as dbases.tar.gz, can instead
+make GSC.db and the columnar files from HP768.db, which holds every star, with convertdb.py
 """
 
 
@@ -26,7 +39,6 @@ HP is the healpix index containing the star
 #
 # activated it, and then
 
-# pip install bitstring
 # pip install astropy
 # pip install astropy_healpix
 #
@@ -34,29 +46,32 @@ HP is the healpix index containing the star
 # have to change the top shebang line of this script
 #
 
-import os, sys, sqlite3
-
-from bitstring import ConstBitStream
+import os, sys, sqlite3, multiprocessing, hashlib
 
 from astropy_healpix import HEALPix
-from astropy.coordinates import ICRS, SkyCoord
+from astropy.coordinates import ICRS
 from astropy import units as u
 import numpy
 
 
-# HEALPix object with nside 2 and 48 pixels
-hp48 = HEALPix(nside=numpy.int64(2), order='nested', frame=ICRS())
+# the nside of the catalog healpix pixels
+NSIDE = 128
 
-# HEALPix object with nside 4 and 192 pixels
-hp192 = HEALPix(nside=numpy.int64(4), order='nested', frame=ICRS())
+# HEALPix object with nside 128 and 196608 pixels
+hp196608 = HEALPix(nside=numpy.int64(NSIDE), order='nested', frame=ICRS())
 
-# HEALPix object with nside 8 and 768 pixels
-hp768 = HEALPix(nside=numpy.int64(8), order='nested', frame=ICRS())
+# magnitude breakpoints, for each pixel the columnar catalog records the first row
+# at each of these magnitudes, these are the magnitude limits of the chart views
+MAG_BREAKS = (4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0, 13.0, 13.5, 13.9, 14.3, 14.6, 14.8, 15.0)
+
+# the columnar files are GSC_<column>.npy for each of these columns
+COLUMNS = ("xyz", "mag", "index", "breakmags", "breaks")
 
 
 
 def read_gsc_file(filepath):
-    "Generator which reads the given file, and yields (GSC_ID, RA, DEC, magnitude) for each star"
+    """Reads the given file, and returns numpy arrays (GSC_ID, RA, DEC, magnitude) of its stars,
+       with GSC_ID an array of strings, and RA, DEC, magnitude float64 arrays"""
 
 
     # Each file starts with ascii header
@@ -88,157 +103,334 @@ def read_gsc_file(filepath):
        # so get the headerlength as an integer
        headerlength = int(fp.read(3).decode(encoding="ascii"))
        header = fp.read(headerlength - 3).decode(encoding="ascii")
-       # remove any start and end spaces
-       header = header.strip()
-       # split the header
-       headerfields = header.split(" ")
-       # print(headerfields)
-
-       region = headerfields[1]
-
-       offset_ra = float(headerfields[3])
-       offset_dec = float(headerfields[5])
-       offset_mag = float(headerfields[7])
-       scale_ra = float(headerfields[8])
-       scale_dec = float(headerfields[9])
-       scale_magnitude = float(headerfields[11])
-
-       # after the header, read each star record, which is 12 bytes
-       # and split into binary areas
-
-       # some stars have multiple entries, ensure only the first is recorded
-       last_id = ''
-
-       while True:
-           star_record = fp.read(12)
-           if star_record == b'':
-               break
-           s = ConstBitStream(star_record)
-           topspare = s.read('bin:1')
-           GSC_ID = s.read('uint:14')
-
-           if last_id == GSC_ID:
-               # A record with this id has been read, skip it
-               continue
-           last_id = GSC_ID
-
-           RA = s.read('uint:22')
-           DEC = s.read('uint:19')
-           pos_error = s.read('uint:9')
-           mag_error = s.read('uint:7')
-           magnitude = s.read('uint:11')
-           mag_band = s.read('uint:4')
-           class_ = s.read('uint:3')
-           plate_id = s.read('uint:4')
-           multiple = s.read('uint:1')
-           spare = s.read('bin:1')
-
-           # some spurious??? records have magnitude 0, since this is unlikely to be an actual star
-           # skip them
-           if magnitude == 0:
-               continue
-
-           # The full GSC_ID is 5 digit region, with five digit star number
-           GSC_ID = f"{region}{GSC_ID:05}"
-
-           RA = offset_ra + RA/scale_ra
-           DEC = offset_dec + DEC/scale_dec
-           magnitude = offset_mag + magnitude/scale_magnitude
-
-           if RA > 360:
-               RA = RA - 360
-           if RA < 0:
-               RA = RA + 360
-
-           yield (GSC_ID, RA, DEC, magnitude)
-
-
-
-def gsc_files(path):
-    "Generator which returns paths to all gsc files ending in .GSC"
-    for root,d_names,f_names in os.walk(path):
-        for f in f_names:
-            if f.endswith(".GSC"):
-                yield os.path.join(root, f)
-
+       # after the header, the rest of the file is the star records
+       records = fp.read()
 
-def create_databases(starcatalogs):
-    "starcatalogs is the directory where they are to be made"
+    # remove any start and end spaces
+    header = header.strip()
+    # split the header
+    headerfields = header.split(" ")
+    # print(headerfields)
 
-    dbpaths = {}          # will hold the path to each database
+    region = headerfields[1]
 
-    # this dictionary will have database names as key (without the .db file extension)
-    # and database paths as values
+    offset_ra = float(headerfields[3])
+    offset_dec = float(headerfields[5])
+    offset_mag = float(headerfields[7])
+    scale_ra = float(headerfields[8])
+    scale_dec = float(headerfields[9])
+    scale_magnitude = float(headerfields[11])
 
-    # database HP48.db has stars to magnitude 6, organised in 48 healpix pixels
-    dbpaths["HP48"] = os.path.join(starcatalogs, "HP48.db")
+    # each star record is 12 bytes, a big endian bit field laid out as
+    #
+    #    bits  0      topspare
+    #    bits  1-14   GSC_ID
+    #    bits 15-36   RA
+    #    bits 37-55   DEC
+    #    bits 56-64   pos_error
+    #    bits 65-71   mag_error
+    #    bits 72-82   magnitude
+    #    bits 83-86   mag_band
+    #    bits 87-89   class
+    #    bits 90-93   plate_id
+    #    bits 94      multiple
+    #    bits 95      spare
+    #
+    # so read the first 8 bytes of every record as one unsigned 64 bit integer, holding bits 0-63
+    # and the last 4 bytes as an unsigned 32 bit integer, holding bits 64-95, and extract
+    # the wanted fields from all records at once with shifts and masks
 
-    # database HP192.db has stars to magnitude 9, organised in 192 healpix pixels
-    dbpaths["HP192"] = os.path.join(starcatalogs, "HP192.db")
+    number = len(records) // 12
+    recordarray = numpy.frombuffer(records, dtype=numpy.uint8, count=number*12).reshape(number, 12)
+    high = recordarray[:, :8].copy().view('>u8').ravel().astype(numpy.uint64)
+    low = recordarray[:, 8:].copy().view('>u4').ravel().astype(numpy.uint32)
 
-    # database HP768.db has all stars, organised in 768 healpix pixels
-    dbpaths["HP768"] = os.path.join(starcatalogs, "HP768.db")
+    ids = (high >> numpy.uint64(49)) & numpy.uint64(0x3FFF)
+    ra = (high >> numpy.uint64(27)) & numpy.uint64(0x3FFFFF)
+    dec = (high >> numpy.uint64(8)) & numpy.uint64(0x7FFFF)
+    magnitude = (low >> numpy.uint32(13)) & numpy.uint32(0x7FF)
 
-    # for every name in dbpaths
-    # create the database
+    # some stars have multiple consecutive entries, ensure only the first is recorded
+    wanted = numpy.ones(number, dtype=bool)
+    wanted[1:] = ids[1:] != ids[:-1]
 
-    for path in dbpaths.values():
-        con = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
-        con.execute("create table stars (HP INTEGER, GSC_ID TEXT, RA REAL, DEC REAL, MAG REAL)")
-        con.execute("create index HP_IDX  on stars(HP)")
-        con.execute("create index MAG_IDX on stars(MAG)")
-        con.commit()
-        con.close()
+    # some spurious??? records have magnitude 0, since this is unlikely to be an actual star
+    # skip them
+    wanted &= magnitude != 0
 
-    return dbpaths
+    ids = ids[wanted]
 
+    # The full GSC_ID is 5 digit region, with five digit star number
+    gsc_id = numpy.char.add(region, numpy.char.zfill(ids.astype(str), 5))
 
+    ra = offset_ra + ra[wanted]/scale_ra
+    dec = offset_dec + dec[wanted]/scale_dec
+    magnitude = offset_mag + magnitude[wanted]/scale_magnitude
 
-def add_record(gsc_id, ra, dec, mag):
-    """Given a star record defined by gsc_id, ra, dec, mag
-       Returns a list of database names and healpix pixel id's which contain this star
-       so the star can be added to each database together with the id for that database
-    """
-    # for the given star, return the names of the databases it is to be added to
-    # and the hp number in each database
+    ra = numpy.where(ra > 360, ra - 360, ra)
+    ra = numpy.where(ra < 0, ra + 360, ra)
 
-    # HP48.db - stars to magnitude 6
-    # HP192.db - stars to magnitude 9
-    # HP768.db - all stars
+    return gsc_id, ra, dec, magnitude
 
-    # a list of lists will be returned; [[dbasename, hp index],....]
 
-    # Example: the healpix index in the global hp48 HEALPix object
-    # can be found using
-    # hp48.skycoord_to_healpix(coords)
-    # where coords is the SkyCoord object for the star
-    # the index is converted to a Python integer, since the method
-    # returns a numpy integer
 
-    coords = SkyCoord(ra=ra*u.deg, dec=dec*u.deg)
+def gsc_files(path, regions=None):
+    """Generator which returns paths to all gsc files ending in .GSC
+       if regions is given, it is a collection of integer region numbers, and only the
+       files of those regions are returned, the file name being the region number"""
+    for root,d_names,f_names in os.walk(path):
+        for f in f_names:
+            if f.endswith(".GSC"):
+                if regions is not None and int(f[:-4]) not in regions:
+                    continue
+                yield os.path.join(root, f)
 
-    recordbases = []
 
-    if mag < 6:
-        recordbases.append(["HP48", int(hp48.skycoord_to_healpix(coords))])
+def regions_in_box(path, ramin, ramax, decmin, decmax):
+    """Returns a set of region numbers of the gsc files which overlap the given box of sky,
+       with limits in degrees, only the file headers are read"""
+    regions = set()
+    for filepath in gsc_files(path):
+        with open(filepath, "rb") as fp:
+            headerlength = int(fp.read(3).decode(encoding="ascii"))
+            headerfields = fp.read(headerlength - 3).decode(encoding="ascii").strip().split(" ")
+        # header fields 3 to 6 are ra offset, ra max, dec offset and dec max
+        ra_lo, ra_hi, dec_lo, dec_hi = (float(field) for field in headerfields[3:7])
+        if dec_hi < decmin or dec_lo > decmax:
+            continue
+        if ra_hi < ra_lo:
+            # the region crosses ra 0
+            if ra_hi < ramin and ra_lo > ramax:
+                continue
+        elif ra_hi < ramin or ra_lo > ramax:
+            continue
+        regions.add(int(headerfields[1]))
+    return regions
+
+
+def create_database(starcatalogs):
+    "starcatalogs is the directory where it is to be made, returns the database path"
+
+    dbpath = os.path.join(starcatalogs, "GSC.db")
+
+    # the tables are only created if they do not exist, so a partly built database can be resumed
+    con = sqlite3.connect(dbpath, detect_types=sqlite3.PARSE_DECLTYPES)
+    con.execute("""create table if not exists stars (HP INTEGER,
+                                                     MAG REAL,
+                                                     GSC_ID TEXT,
+                                                     RA REAL,
+                                                     DEC REAL,
+                                                     PRIMARY KEY(HP, MAG, GSC_ID)) WITHOUT ROWID""")
+    con.execute("""create table if not exists manifest (PATH TEXT PRIMARY KEY,
+                                                        REGION TEXT,
+                                                        ROWS INTEGER,
+                                                        CHECKSUM TEXT)""")
+    con.commit()
+    con.close()
+
+    return dbpath
+
+
+
+def create_columnar(dbpath, starcatalogs):
+    """Exports the database to columnar numpy .npy files in the starcatalogs directory, these are:
+
+       GSC_xyz.npy - float32 Cartesian unit vectors, one row (x, y, z) per star
+       GSC_mag.npy - int16 magnitude in thousandths of a magnitude
+       GSC_index.npy - int64 offsets, the stars of healpix pixel p are rows index[p] to index[p+1]
+       GSC_breakmags.npy - int16 MAG_BREAKS, in thousandths of a magnitude
+       GSC_breaks.npy - int64, breaks[p,j] is the first row of pixel p not brighter than breakmags[j]
+
+       The rows are in the database order, sorted by healpix pixel, and then by magnitude within each pixel,
+       so the stars of a pixel brighter than a breakpoint are the rows index[p] to breaks[p,j]"""
+
+    con = sqlite3.connect(dbpath, detect_types=sqlite3.PARSE_DECLTYPES)
+    try:
+        rows = con.execute("select count(*) from stars").fetchone()[0]
+        hp = numpy.empty(rows, dtype=numpy.int64)
+        xyz = numpy.empty((rows, 3), dtype=numpy.float32)
+        mag = numpy.empty(rows, dtype=numpy.int16)
+        cur = con.execute("select HP, RA, DEC, MAG from stars order by HP, MAG")
+        n = 0
+        while True:
+            chunk = cur.fetchmany(100000)
+            if not chunk:
+                break
+            chunk = numpy.array(chunk, dtype=numpy.float64)
+            m = n + len(chunk)
+            hp[n:m] = chunk[:,0]
+            # the star chart projects stars from their unit vectors, so these are calculated here once
+            ra = numpy.radians(chunk[:,1])
+            dec = numpy.radians(chunk[:,2])
+            xyz[n:m, 0] = numpy.cos(dec) * numpy.cos(ra)
+            xyz[n:m, 1] = numpy.cos(dec) * numpy.sin(ra)
+            xyz[n:m, 2] = numpy.sin(dec)
+            mag[n:m] = numpy.rint(chunk[:,3]*1000)
+            n = m
+    finally:
+        con.close()
 
-    if mag < 9:
-        recordbases.append(["HP192", int(hp192.skycoord_to_healpix(coords))])
+    npix = 12 * NSIDE * NSIDE
+    # index[p] is the first row of pixel p, index[npix] is the number of rows
+    index = numpy.searchsorted(hp, numpy.arange(npix+1)).astype(numpy.int64)
+
+    # within each pixel the rows are sorted by magnitude, so sorting by the combined key
+    # hp * 65536 + mag gives the breakpoints of every pixel with a single searchsorted
+    breakmags = numpy.rint(numpy.array(MAG_BREAKS)*1000).astype(numpy.int16)
+    key = hp * 65536 + mag.astype(numpy.int64)
+    wanted = numpy.arange(npix, dtype=numpy.int64)[:, None] * 65536 + breakmags.astype(numpy.int64)
+    breaks = numpy.searchsorted(key, wanted.ravel()).reshape(npix, len(breakmags)).astype(numpy.int64)
+
+    columns = {"xyz":xyz, "mag":mag, "index":index, "breakmags":breakmags, "breaks":breaks}
+    # each file is written under a temporary name, and all are renamed into place once written,
+    # so an interrupted export leaves the previous files, older than the database, to be replaced
+    for name, column in columns.items():
+        with open(os.path.join(starcatalogs, f"GSC_{name}.npy.tmp"), "wb") as fp:
+            numpy.save(fp, column)
+    for name in columns:
+        os.replace(os.path.join(starcatalogs, f"GSC_{name}.npy.tmp"), os.path.join(starcatalogs, f"GSC_{name}.npy"))
+    print("GSC columnar files written")
+
+
+def columnar_current(dbpath, starcatalogs):
+    "Returns True if all the columnar files in the starcatalogs directory exist, and are newer than the database"
+    dbtime = os.path.getmtime(dbpath)
+    for name in COLUMNS:
+        filepath = os.path.join(starcatalogs, f"GSC_{name}.npy")
+        if not os.path.isfile(filepath) or os.path.getmtime(filepath) < dbtime:
+            return False
+    return True
+
+
+
+def convert_catalog(sourcepath, dbpath, batch=1000000):
+    """Loads the stars of an older sqlite catalog, such as HP768.db from the downloaded dbases.tar.gz,
+       which has a table 'stars' with columns (HP INTEGER, GSC_ID TEXT, RA REAL, DEC REAL, MAG REAL)
+       into the database at dbpath, replacing any stars already there. The HP of the older catalog is
+       of a coarser nside, so the nside 128 healpix pixel of each star is calculated from its RA, DEC.
+
+       This makes the catalog without downloading the GSC source files, the stars being read in
+       batches of batch rows into an unindexed load table, and then copied in primary key order into
+       the clustered stars table. Returns the number of stars loaded."""
+
+    source = sqlite3.connect(sourcepath, detect_types=sqlite3.PARSE_DECLTYPES)
+    con = sqlite3.connect(dbpath, detect_types=sqlite3.PARSE_DECLTYPES)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    con.execute("drop table if exists load")
+    con.execute("create table load (HP INTEGER, MAG REAL, GSC_ID TEXT, RA REAL, DEC REAL)")
+    con.commit()
+    loaded = 0
+    try:
+        cur = source.execute("select GSC_ID, RA, DEC, MAG from stars")
+        while True:
+            chunk = cur.fetchmany(batch)
+            if not chunk:
+                break
+            gsc_id, ra, dec, mag = zip(*chunk)
+            hp = hp196608.lonlat_to_healpix(numpy.array(ra)*u.deg, numpy.array(dec)*u.deg)
+            con.executemany("insert into load values (?, ?, ?, ?, ?)", zip(hp.tolist(), mag, gsc_id, ra, dec))
+            con.commit()
+            loaded += len(chunk)
+            print(f"{loaded} stars read")
+        # the stars are not from GSC files, so none are recorded in the manifest
+        con.execute("delete from stars")
+        con.execute("delete from manifest")
+        con.execute("insert or replace into stars select HP, MAG, GSC_ID, RA, DEC from load order by HP, MAG, GSC_ID")
+        con.execute("drop table load")
+        con.commit()
+        con.execute("VACUUM")
+    finally:
+        con.close()
+        source.close()
+    return loaded
 
-    recordbases.append(["HP768", int(hp768.skycoord_to_healpix(coords))])
 
 
-    return recordbases
+def decode_file(job):
+    """Run by each worker process of build_catalog, job is a tuple (filepath, checksum) where
+       checksum is that recorded in the manifest, or None if the file has not been loaded.
+       Decodes the file and computes the healpix pixel of every star in one vectorised call.
+       Returns (filepath, region, checksum, rows) with rows a list of (HP, MAG, GSC_ID, RA, DEC)
+       ready for insertion, or rows None if the file is unchanged since it was loaded"""
+    filepath, loaded = job
+    with open(filepath, "rb") as fp:
+        checksum = hashlib.sha256(fp.read()).hexdigest()
+    if checksum == loaded:
+        return filepath, None, checksum, None
+    gsc_id, ra, dec, mag = read_gsc_file(filepath)
+    # the region is the first five characters of every GSC_ID, taken from the file name
+    # as a file with no valid stars has no GSC_ID
+    region = os.path.basename(filepath)[:-4].zfill(5)
+    hp = hp196608.lonlat_to_healpix(ra*u.deg, dec*u.deg)
+    rows = list(zip(hp.tolist(), mag.tolist(), gsc_id.tolist(), ra.tolist(), dec.tolist()))
+    return filepath, region, checksum, rows
+
+
+def build_catalog(directory, dbpath, regions=None, processes=None, batch=1000000):
+    """Reads the GSC files under directory into the database at dbpath, optionally
+       only those of the given regions, a collection of integer region numbers.
+
+       The files are decoded by a pool of processes worker processes, defaulting to the number of cpus,
+       and the rows streamed to this single writer process, which inserts them with executemany
+       in transactions of at least batch rows into an unindexed load table. Each file's rows are
+       committed together with its manifest entry, so if the build is interrupted, running it again
+       skips the files already done. A file whose checksum differs from the manifest has the rows of
+       its region replaced. Once all are loaded, the rows are copied in primary key order into the
+       clustered stars table.
+
+       Returns the number of files loaded, zero if the database was already up to date."""
+
+    con = sqlite3.connect(dbpath, detect_types=sqlite3.PARSE_DECLTYPES)
+    # the write ahead log keeps the database intact if the build is killed
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    try:
+        manifest = dict(con.execute("select PATH, CHECKSUM from manifest"))
+        jobs = [(filepath, manifest.get(filepath)) for filepath in gsc_files(directory, regions)]
+        loaded = 0
+        pending = 0
+        with multiprocessing.Pool(processes) as pool:
+            for filepath, region, checksum, rows in pool.imap_unordered(decode_file, jobs, chunksize=4):
+                if rows is None:
+                    continue
+                # the load table is only made when there are rows to load, so when every file is
+                # unchanged the database is not written, and keeps the time it was last built
+                con.execute("create table if not exists load (HP INTEGER, MAG REAL, GSC_ID TEXT, RA REAL, DEC REAL)")
+                if filepath in manifest:
+                    # a corrected file, remove the stars of its region before loading the new ones
+                    con.execute("delete from stars where substr(GSC_ID, 1, 5) = ?", (region,))
+                    con.execute("delete from load where substr(GSC_ID, 1, 5) = ?", (region,))
+                con.executemany("insert into load values (?, ?, ?, ?, ?)", rows)
+                con.execute("insert or replace into manifest values (?, ?, ?, ?)", (filepath, region, len(rows), checksum))
+                loaded += 1
+                pending += len(rows)
+                if pending >= batch:
+                    con.commit()
+                    pending = 0
+                # print filepath so you can see something
+                print(filepath)
+        con.commit()
+        if con.execute("select count(*) from sqlite_master where type = 'table' and name = 'load'").fetchone()[0]:
+            # build the clustered table in a single pass, in primary key order, this also merges any rows
+            # left in the load table by an interrupted build
+            con.execute("insert or replace into stars select HP, MAG, GSC_ID, RA, DEC from load order by HP, MAG, GSC_ID")
+            con.execute("drop table load")
+            con.commit()
+        if loaded:
+            con.execute("VACUUM")
+    finally:
+        con.close()
+    return loaded
 
 
 
 if __name__ == "__main__":
 
-    # create databases
-    dbpaths = create_databases("dbases")
+    # create database, or open it to continue an interrupted build
+    dbpath = create_database("dbases")
 
-    # dbases is the directory where the databases will be created, and must exist
-    # dpaths is database name to path dictionary
+    # dbases is the directory where the database will be created, and must exist
 
     directory = "cdsarc.u-strasbg.fr/pub/cats/I/254/GSC"
 
@@ -253,28 +445,30 @@ if __name__ == "__main__":
     # use the special escape string of %40 instead of the @ character in the email address
     # expect the download to take some time (an hour)
 
-    # The following builds sqlite databases in the directory "dbases", printing out each
-    # filepath from the catalogue as it is read. This will take a long time, several hours.
-
-    for filepath in gsc_files(directory):
-        connections = {}
-        for star in read_gsc_file(filepath):
-            # star = GSC_ID, RA, DEC, magnitude
-            # get the database names and hp number which should have this record inserted
-            recordbases = add_record(*star)
-            for name, hp in recordbases:
-                if name not in connections:
-                    path =  dbpaths[name]
-                    connections[name] = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
-                connections[name].execute("insert into stars values (?, ?, ?, ?, ?)", (hp, *star))
-        # commit and close the database connections after reading this file
-        for con in connections.values():
-            con.commit()
-            con.close()
-        # print filepath so you can see something
-        print(filepath)
-        # then repeats for the next file until all files read
-
-
-
+    # The following builds the sqlite database in the directory "dbases", printing out each
+    # filepath from the catalogue as it is read. The files are decoded in parallel, one worker
+    # process for each cpu, so this takes minutes on a multi-core machine.
 
+    # Files already recorded in the manifest with an unchanged checksum are skipped, and the columnar
+    # files are only exported if they are missing or older than the database, so if the build is
+    # interrupted, simply run this script again. Region numbers can be given as arguments to load only
+    # those files, for example to replace corrected source files, or the regions covering an area of sky
+    # can be found from the file headers, with arguments --box ramin ramax decmin decmax in degrees,
+    # for example
+    #
+    # python3 builddb.py --box 80 90 20 25
+    #
+    # After replacing files, run cleandb.py again to remove spurious items.
+
+    if sys.argv[1:2] == ["--box"]:
+        ramin, ramax, decmin, decmax = (float(arg) for arg in sys.argv[2:6])
+        regions = regions_in_box(directory, ramin, ramax, decmin, decmax)
+        print(f"Regions {sorted(regions)}")
+    else:
+        regions = set(int(arg) for arg in sys.argv[1:]) or None
+
+    if build_catalog(directory, dbpath, regions) or not columnar_current(dbpath, "dbases"):
+        # finally export the database to the columnar files read by the star chart
+        create_columnar(dbpath, "dbases")
+    else:
+        print("GSC.db and the columnar files are up to date")
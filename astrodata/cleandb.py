@@ -1,31 +1,20 @@
 
-"""This script deletes spurious items
+
+"""This script deletes spurious items from the star catalog, and then
+re-exports the columnar files read by the star chart
 """
 
 import sqlite3
 
-# database HP48.db has stars to magnitude 6, organised in 48 healpix pixels
-_HP48 = "dbases/HP48.db"
-
-# database HP192.db has stars to magnitude 9, organised in 192 healpix pixels
-_HP192 = "dbases/HP192.db"
+from builddb import create_columnar
 
-# database HP768.db has all stars, organised in 768 healpix pixels
-_HP768 = "dbases/HP768.db"
+# database GSC.db has all stars, organised in nside 128 healpix pixels
+_GSC = "dbases/GSC.db"
 
 items = ['0645301224']
 
 try:
-    con = sqlite3.connect(_HP48, detect_types=sqlite3.PARSE_DECLTYPES)
-    cur = con.cursor()
-    for gsc_id in items:
-        cur.execute("DELETE FROM stars WHERE GSC_ID=?", (gsc_id,))
-    con.commit()
-finally:
-    con.close()
-
-try:
-    con = sqlite3.connect(_HP192, detect_types=sqlite3.PARSE_DECLTYPES)
+    con = sqlite3.connect(_GSC, detect_types=sqlite3.PARSE_DECLTYPES)
     cur = con.cursor()
     for gsc_id in items:
         cur.execute("DELETE FROM stars WHERE GSC_ID=?", (gsc_id,))
@@ -33,15 +22,6 @@ try:
 finally:
     con.close()
 
-try:
-    con = sqlite3.connect(_HP768, detect_types=sqlite3.PARSE_DECLTYPES)
-    cur = con.cursor()
-    for gsc_id in items:
-        cur.execute("DELETE FROM stars WHERE GSC_ID=?", (gsc_id,))
-    con.commit()
-finally:
-    con.close()
-
-
+create_columnar(_GSC, "dbases")
 
 
@@ -0,0 +1,25 @@
+"""This script makes the star catalog GSC.db, and the columnar files read by the star chart,
+from the older sqlite catalog dbases/HP768.db, which holds every star, so the columnar files
+can be made from the downloaded dbases.tar.gz without the GSC source files. Run it from the
+astrodata directory, it is called by copytowww
+
+python3 convertdb.py
+"""
+
+import os, sys
+
+from builddb import create_database, convert_catalog, create_columnar
+
+_HP768 = "dbases/HP768.db"
+
+if not os.path.isfile(_HP768):
+    print(f"{_HP768} not found")
+    sys.exit(1)
+
+dbpath = os.path.join("dbases", "GSC.db")
+if not os.path.isfile(dbpath):
+    create_database("dbases")
+
+print(f"{convert_catalog(_HP768, dbpath)} stars loaded into GSC.db")
+
+create_columnar(dbpath, "dbases")
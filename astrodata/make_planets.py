@@ -9,14 +9,16 @@
 
 
 
-import os, sys, sqlite3, datetime, math, time
+import os, sys, sqlite3, datetime, math, time, multiprocessing
 
 import redis
 
 try:
     import astropy.units as u
-    from astropy.coordinates import SkyCoord, EarthLocation, AltAz, name_resolve, solar_system_ephemeris, get_body, Angle
+    from astropy.coordinates import EarthLocation, AltAz, solar_system_ephemeris, get_body
     from astropy.time import Time
+    import numpy as np
+    from numpy.polynomial import chebyshev
 except:
     sys.exit(1)
 
@@ -31,6 +33,34 @@ LONGITUDE = -2.1544
 LATITUDE = 53.7111
 ELEVATION = 316
 
+# For each body, (horizon, cadence), positions are made from today for horizon days, at intervals
+# of cadence minutes. The cadence must divide the hour, as every body has a position at 30 minutes
+# past each hour, which the planning pages read. The moon moves about half a degree an hour, so it
+# is sampled more finely, to keep positions interpolated between samples accurate
+BODIES = {"mercury": (10, 60),
+          "venus":   (10, 60),
+          "moon":    (10, 10),
+          "mars":    (10, 60),
+          "jupiter": (10, 60),
+          "saturn":  (10, 60),
+          "uranus":  (10, 60),
+          "neptune": (10, 60),
+          "pluto":   (10, 60)}
+
+# Positions are also stored in table CHEBYSHEV as polynomial segments, one for each body for each day
+# from midnight, over SEGMENT_DAYS days. Each segment holds the Chebyshev coefficients, of degree
+# CHEBYSHEV_DEGREE, of the x, y, z coordinates in AU of the body in the GCRS frame of the observatory,
+# as given by get_body. These are evaluated by remscope_packages/stars.py at any time, without astropy
+# calculating the position, and a degree of 12 fits the moon, the fastest body, to better than 0.01 arcseconds
+SEGMENT_DAYS = 60
+CHEBYSHEV_DEGREE = 12
+
+_CHEBYSHEV_TABLE = """CREATE TABLE IF NOT EXISTS CHEBYSHEV(START timestamp,
+                                                         NAME TEXT NOT NULL,
+                                                         SECONDS REAL,
+                                                         COEFFS BLOB,
+                                                         PRIMARY KEY(START,NAME))"""
+
 
 
 def create_database():
@@ -51,6 +81,8 @@ def create_database():
                                               ALT REAL,
                                               AZ REAL,
                                               PRIMARY KEY(DATEANDTIME,NAME))""")
+        # and the table of polynomial segments, with segment start datetime, planet name as primary key
+        con.execute(_CHEBYSHEV_TABLE)
         con.commit()
     except:
         return 2, "Unable to create table in the new database file %s." % (PLANETDB,)
@@ -75,6 +107,8 @@ def delete_old():
     twohoursago = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
     try:
         c.execute('DELETE FROM POSITIONS WHERE DATEANDTIME<?', (twohoursago,))
+        # and segments which ended before then
+        c.execute('DELETE FROM CHEBYSHEV WHERE START<?', (twohoursago - datetime.timedelta(days=1),))
         con.commit()
         print("Rows deleted: %s" % (con.total_changes,))
     except:
@@ -87,30 +121,41 @@ def delete_old():
 
 
 
-def make_ten_days(astro_centre):
-    "For each planet, create the positions over ten days"
+def make_ephemeris(astro_centre, bodies=BODIES, processes=None):
+    """For each body, create the positions over its horizon at its cadence, bodies being a dictionary
+       of body name to (horizon days, cadence minutes), and the polynomial segments over SEGMENT_DAYS.
+       The bodies are calculated by a pool of processes worker processes, defaulting to the number
+       of cpus, and all are added in a single transaction"""
 
     # connect to database
     try:
         con = sqlite3.connect(PLANETDB, detect_types=sqlite3.PARSE_DECLTYPES)
         con.execute("PRAGMA foreign_keys = 1")
+        # databases made before the segments were added do not have the table
+        con.execute(_CHEBYSHEV_TABLE)
     except:
         return 3
 
-    planets = ("mercury", "venus", "moon", "mars", "jupiter", "saturn", "uranus", "neptune", "pluto")
-
     todaydate = datetime.datetime.utcnow().date()
-    # set an initial time at 0 am today
-    dt = datetime.datetime(todaydate.year, todaydate.month, todaydate.day, hour=0)
-    oneday = datetime.timedelta(days=1)
+    midnight = datetime.datetime(todaydate.year, todaydate.month, todaydate.day, hour=0)
+
+    jobs = []
+    for planet, (horizon, cadence) in bodies.items():
+        if 60 % cadence:
+            con.close()
+            return 7
+        # the times start at, or just after, midnight so 30 minutes past each hour is included
+        dt = midnight + datetime.timedelta(minutes=30 % cadence)
+        step = datetime.timedelta(minutes=cadence)
+        ptimes = [dt + step*n for n in range(horizon*24*60 // cadence)]
+        jobs.append((astro_centre, ptimes, planet, midnight))
 
     try:
-        for day in range(10):
-            for planet in planets:
-                status = make_day(astro_centre, dt, planet, con)
-                if status:
-                    return status
-            dt += oneday
+        with multiprocessing.Pool(processes) as pool:
+            for rows, segments in pool.imap_unordered(_make_body, jobs):
+                # positions already in the database are ignored, as the primary key is (DATEANDTIME, NAME)
+                con.executemany("INSERT OR IGNORE INTO POSITIONS VALUES (?, ?, ?, ?, ?, ?)", rows)
+                con.executemany("INSERT OR IGNORE INTO CHEBYSHEV VALUES (?, ?, ?, ?)", segments)
         con.commit()
         print("Rows added: %s" % (con.total_changes,))
     except:
@@ -122,42 +167,43 @@ def make_ten_days(astro_centre):
     return 0
 
 
-def make_day(astro_centre, dt, planet, con):
-    "For the given planet, create the position at hourly intervals over the day"
-    c = con.cursor()
-
-    for hr in range(24):
-        ptime = dt + datetime.timedelta(hours=hr, minutes=30)
-        # so ptime is the position time, check if it exists in the database
+def _make_body(job):
+    """Called in a worker process with job (astro_centre, ptimes, planet, midnight),
+       returns a tuple of the make_positions rows, and the make_segments rows"""
+    astro_centre, ptimes, planet, midnight = job
+    return make_positions(astro_centre, ptimes, planet), make_segments(astro_centre, midnight, SEGMENT_DAYS, planet)
 
-        item = (ptime, planet)
 
-        c.execute('SELECT * FROM POSITIONS WHERE DATEANDTIME=? AND NAME=?', item)
-        result=c.fetchone()
-        if result is not None:
-            # This position is already created, so skip making it again
-            continue
-        # so for the given ptime, and planet, create a position
-        make_position(astro_centre, ptime, planet, con)
-        
-
-def make_position(astro_centre, ptime, planet, con):
-    "Use astropy to get the position, and then insert the data"
-    
-    time = Time(ptime, format='datetime', scale='utc')
-    target = get_body(planet, time, astro_centre)
+def make_positions(astro_centre, ptimes, planet):
+    """Use astropy to get the positions of the planet at each of the datetimes in ptimes, with a
+       single array valued time, and return a list of (ptime, planet, ra, dec, alt, az) rows"""
+    times = Time(ptimes, format='datetime', scale='utc')
+    target = get_body(planet, times, astro_centre)
     # altitude and azimuth
-    target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
-    # insert these into the database
-    c = con.cursor()
-    c.execute("INSERT INTO POSITIONS VALUES (?, ?, ?, ?, ?, ?)", (ptime,
-                                                                  planet,
-                                                                  target.ra.degree,
-                                                                  target.dec.degree,
-                                                                  target_altaz.alt.degree,
-                                                                  target_altaz.az.degree))
-
-
+    target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+    return list(zip(ptimes,
+                    [planet]*len(ptimes),
+                    target.ra.degree.tolist(),
+                    target.dec.degree.tolist(),
+                    target_altaz.alt.degree.tolist(),
+                    target_altaz.az.degree.tolist()))
+
+def make_segments(astro_centre, start, days, planet):
+    """Fit the position of the planet with a Chebyshev polynomial for each day from the datetime start,
+       with a single array valued time, and return a list of (segment start, planet, seconds, coefficients) rows"""
+    # the positions are calculated at the Chebyshev nodes of each day, so the polynomial through them is a close fit
+    n = CHEBYSHEV_DEGREE + 1
+    nodes = np.cos(np.pi * (np.arange(n) + 0.5) / n)[::-1]
+    seconds = (np.arange(days)[:, None] * 86400 + (nodes + 1) * 43200).ravel()
+    times = Time(start, format='datetime', scale='utc') + seconds*u.s
+    target = get_body(planet, times, astro_centre)
+    # xyz has shape (3, days*n), rearrange as (n, days*3), so each column is one coordinate of one day
+    xyz = target.cartesian.xyz.to_value(u.au)
+    values = xyz.reshape(3, days, n).transpose(2, 1, 0).reshape(n, days*3)
+    coeffs = np.linalg.solve(chebyshev.chebvander(nodes, CHEBYSHEV_DEGREE), values)
+    # coeffs has shape (n, days*3), rearrange as (days, 3, n) for each day's blob
+    coeffs = coeffs.reshape(n, days, 3).transpose(1, 2, 0)
+    return [(start + datetime.timedelta(days=day), planet, 86400.0, np.ascontiguousarray(coeffs[day], dtype=np.float64).tobytes()) for day in range(days)]
 
 
 
@@ -244,12 +290,12 @@ if __name__ == "__main__":
 
     astro_centre = EarthLocation.from_geodetic(LONGITUDE, LATITUDE, ELEVATION)
 
-    # make ten days of planet positions and set into the sqlite database
-    status = make_ten_days(astro_centre)
+    # make planet positions and set into the sqlite database
+    status = make_ephemeris(astro_centre)
     if status:
         message = f"Planet calculations failed with status {status}"
     else:
-        message = "Ten days of planet data calculated"
+        message = "Planet data calculated"
 
     try:
         rconn = redis.Redis(host='localhost', port=6379, db=0, socket_timeout=5)
@@ -207,6 +207,7 @@ def make_proj_data():
             'rconn_2':"remscope_authenticated_",
             'rconn_3':"remscope_pintrycounts_",
             'rconn_4':"remscope_sessions_",
+            'rconn_5':"remscope_charts_",
             'projectfiles':PROJECTFILES,
             'redisserver':REDISSERVER}
 
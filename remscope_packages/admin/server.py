@@ -9,7 +9,7 @@ import os, pathlib
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from .. import sun, database_ops, redis_ops, cfg
+from .. import sun, database_ops, redis_ops, cfg, stars
 
 
 def create_index(skicall):
@@ -115,6 +115,32 @@ def server_settings(skicall):
         page_data['logtext', 'pre_text'] = "Awaiting events"
     else:
         page_data['logtext', 'pre_text'] = "\n".join(event_list)
+    ######## star chart tile cache
+    cache = stars.star_cache_info()
+    lookups = cache['hits'] + cache['misses']
+    if lookups:
+        hitrate = 100.0 * cache['hits'] / lookups
+    else:
+        hitrate = 0.0
+    page_data['cachetext', 'pre_text'] = f"""Tiles held: {cache['entries']}
+Bytes held: {cache['size']} of {cache['maxsize']}
+Hits: {cache['hits']}
+Misses: {cache['misses']}
+Hit rate: {hitrate:.1f}%"""
+
+    ######## finished chart cache, held by this server process
+    charts = stars.chart_cache_info()
+    page_data['cachetext', 'pre_text'] += f"""
+Charts held: {charts['entries']} of {charts['maxsize']}
+Chart hits: {charts['hits']}
+Chart misses: {charts['misses']}"""
+
+    ######## healpix cone search cache
+    cones = stars.cone_cache_info()
+    page_data['cachetext', 'pre_text'] += f"""
+Cone searches held: {cones.currsize} of {cones.maxsize}
+Cone search hits: {cones.hits}
+Cone search misses: {cones.misses}"""
 
 
 
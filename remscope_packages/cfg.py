@@ -16,7 +16,16 @@ _CONFIG = {
             'redis_port' : 6379,
             'redis_auth' : '',
             'door_name' : "Roll off door",             # The name as given by the indi driver
-            'telescope_name' : 'Telescope Simulator'   # The name as given by the indi driver
+            'telescope_name' : 'Telescope Simulator',  # The name as given by the indi driver
+            'star_cache_bytes' : 67108864,             # Maximum bytes of star data held in the chart tile cache
+            'chart_cache_entries' : 256,               # Maximum number of finished star charts held in each server process
+            'chart_star_budget' : 4000,                # Maximum number of stars drawn on a chart, fainter stars are dropped
+            'chart_decimals' : 1,                      # Decimal places of star chart positions and diameters sent, None for full precision
+            'chart_refresh_fraction' : 0.002,          # Fraction of the view the telescope must move before a refresh redraws the chart
+            'catalog_threads' : 0,                     # Threads reading star catalog pixels concurrently, 0 to read them in turn
+            'catalog_fanout_pixels' : 32,              # Pixels a chart must read before they are read by the catalog threads
+            'name_cache_days' : 30,                    # Days an object name resolved to a position is remembered
+            'name_miss_hours' : 6                      # Hours an object name the resolver did not find is remembered as not found
           }
 
 # This is a dictionary of nominal planet magnitudes for the star chart
@@ -40,6 +49,7 @@ def set_projectfiles(projectfiles):
     _CONFIG['servedfiles_directory'] = os.path.join(projectfiles, 'astrodata', 'served')
     _CONFIG['dbbackups_directory'] = os.path.join(projectfiles, 'astrodata', 'served', 'backups')
     _CONFIG['planetdb'] = os.path.join(projectfiles, 'astrodata', 'planet.db')
+    _CONFIG['namesdb'] = os.path.join(projectfiles, 'astrodata', 'names.db')
     _CONFIG['constellation_lines'] = os.path.join(projectfiles, 'astrodata', 'lines.csv')
     _CONFIG['star_catalogs'] = os.path.join(projectfiles, 'astrodata', 'dbases')
     _CONFIG['maindb'] = os.path.join(projectfiles, 'astrodata', 'maindb', 'main.db')
@@ -60,6 +70,36 @@ def get_constellation_lines():
     return _CONSTELLATION_LINES
 
 
+def chart_cache_entries():
+    "Returns the maximum number of finished star charts held in memory"
+    return _CONFIG['chart_cache_entries']
+
+
+def chart_star_budget():
+    "Returns the maximum number of stars drawn on a star chart"
+    return _CONFIG['chart_star_budget']
+
+
+def chart_decimals():
+    "Returns the number of decimal places of star chart values sent to the browser, or None for full precision"
+    return _CONFIG['chart_decimals']
+
+
+def chart_refresh_fraction():
+    "Returns the fraction of the chart view the telescope must move before a chart refresh redraws the chart"
+    return _CONFIG['chart_refresh_fraction']
+
+
+def catalog_threads():
+    "Returns the number of threads reading star catalog pixels concurrently, zero for no concurrent reads"
+    return _CONFIG['catalog_threads']
+
+
+def catalog_fanout_pixels():
+    "Returns the number of star catalog pixels a chart must read before they are read concurrently"
+    return _CONFIG['catalog_fanout_pixels']
+
+
 def get_redis():
     "Returns tuple of redis ip, port, auth"
     return (_CONFIG['redis_ip'], _CONFIG['redis_port'], _CONFIG['redis_auth'])
@@ -84,6 +124,18 @@ def get_planetdb():
     "Returns the path to the database file which stores planet positions"
     return _CONFIG['planetdb']
 
+def get_namesdb():
+    "Returns the path to the database file which caches object names resolved to positions"
+    return _CONFIG['namesdb']
+
+def name_cache_days():
+    "Returns the number of days an object name resolved to a position is remembered"
+    return _CONFIG['name_cache_days']
+
+def name_miss_hours():
+    "Returns the number of hours an object name which was not found is remembered as not found"
+    return _CONFIG['name_miss_hours']
+
 def get_maindb():
     "Returns the path to the database file which stores slot sessions and usernames and passwords"
     return _CONFIG['maindb']
@@ -100,6 +152,10 @@ def door():
     "Returns the door name, as given by its indi driver"
     return _CONFIG['door_name']
 
+def star_cache_bytes():
+    "Returns the maximum bytes of star data held in the chart tile cache"
+    return _CONFIG['star_cache_bytes']
+
 
 
 
@@ -0,0 +1,251 @@
+
+
+"""Fast coordinate conversions, using numpy only, for the interactive pages where a position is
+converted for display on every click, and astropy's full transforms take tens of milliseconds.
+
+Times are naive datetime objects in UTC, angles are in degrees, and ra, dec, alt, az may be
+floats or numpy arrays.
+
+The conversions apply IAU 1976 precession, the largest terms of IAU 1980 nutation, annual
+aberration and the sidereal time, and take UT1 as UTC. Against astropy, for dates 2000 to 2040
+and positions above the horizon, they agree to within about 20 arcseconds, most of which is
+UT1-UTC, which astropy reads from the IERS tables. The comparison is made by the tests:
+
+python3 -m pytest tests
+
+The authoritative positions sent to the telescope are still calculated with astropy."""
+
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+
+# degrees to radians, and arcseconds to radians
+_RAD = math.pi / 180.0
+_ARCSEC = _RAD / 3600.0
+
+# the constant of aberration, in radians
+_KAPPA = 20.49552 * _ARCSEC
+
+# the Julian date of the J2000.0 epoch
+_J2000 = 2451545.0
+
+
+def julian_date(dt):
+    "Returns the Julian date of dt, a naive UTC datetime"
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return 2440587.5 + (dt - datetime(1970, 1, 1)).total_seconds() / 86400.0
+
+
+def _centuries(dt):
+    "Returns Julian centuries from J2000.0 to dt"
+    return (julian_date(dt) - _J2000) / 36525.0
+
+
+def _unit_vector(ra, dec):
+    "Returns an array of shape (3, ...) of the unit vectors at ra, dec"
+    ra = np.radians(ra)
+    dec = np.radians(dec)
+    return np.array([np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra), np.sin(dec)])
+
+
+def _ra_dec(vector):
+    "Returns ra, dec in degrees, ra from 0 to 360, of vectors of shape (3, ...)"
+    x, y, z = vector
+    ra = np.mod(np.degrees(np.arctan2(y, x)), 360.0)
+    dec = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    return ra, dec
+
+
+def _rotation(axis, angle):
+    "Returns the matrix rotating the coordinate frame about the given axis, 0, 1 or 2, by angle radians"
+    c, s = math.cos(angle), math.sin(angle)
+    i, j = [(1, 2), (2, 0), (0, 1)][axis]
+    matrix = np.identity(3)
+    matrix[i, i] = c
+    matrix[j, j] = c
+    matrix[i, j] = s
+    matrix[j, i] = -s
+    return matrix
+
+
+def precession_matrix(dt):
+    "Returns the IAU 1976 matrix precessing J2000 equatorial vectors to the mean equator and equinox of dt"
+    t = _centuries(dt)
+    zeta = (2306.2181*t + 0.30188*t*t + 0.017998*t*t*t) * _ARCSEC
+    z = (2306.2181*t + 1.09468*t*t + 0.018203*t*t*t) * _ARCSEC
+    theta = (2004.3109*t - 0.42665*t*t - 0.041833*t*t*t) * _ARCSEC
+    return _rotation(2, -z) @ _rotation(1, theta) @ _rotation(2, -zeta)
+
+
+def nutation(dt):
+    """Returns (dpsi, deps, eps) in radians, the nutation in longitude and obliquity, and the mean
+       obliquity of the ecliptic, at dt, from the largest terms of IAU 1980 nutation, to about 0.5 arcseconds"""
+    t = _centuries(dt)
+    # longitude of the moon's ascending node, and mean longitudes of the sun and moon
+    omega = (125.04452 - 1934.136261*t) * _RAD
+    sun = (280.4665 + 36000.7698*t) * _RAD
+    moon = (218.3165 + 481267.8813*t) * _RAD
+    dpsi = (-17.20*math.sin(omega) - 1.32*math.sin(2*sun) - 0.23*math.sin(2*moon) + 0.21*math.sin(2*omega)) * _ARCSEC
+    deps = (9.20*math.cos(omega) + 0.57*math.cos(2*sun) + 0.10*math.cos(2*moon) - 0.09*math.cos(2*omega)) * _ARCSEC
+    eps = (84381.448 - 46.8150*t - 0.00059*t*t + 0.001813*t*t*t) * _ARCSEC
+    return dpsi, deps, eps
+
+
+def nutation_matrix(dt):
+    "Returns the matrix rotating mean equatorial vectors of dt to the true equator and equinox of dt"
+    dpsi, deps, eps = nutation(dt)
+    return _rotation(0, -(eps + deps)) @ _rotation(2, -dpsi) @ _rotation(0, eps)
+
+
+def _aberration(dt):
+    """Returns the earth's velocity divided by the speed of light, as an equatorial vector of dt,
+       from the sun's longitude, to about 0.1 arcseconds"""
+    t = _centuries(dt)
+    mean_longitude = 280.46646 + 36000.76983*t
+    anomaly = (357.52911 + 35999.05029*t) * _RAD
+    # the sun's true longitude, the eccentricity of the earth's orbit and longitude of its perihelion
+    longitude = (mean_longitude + (1.914602 - 0.004817*t)*math.sin(anomaly) + 0.019993*math.sin(2*anomaly)) * _RAD
+    e = 0.016708634 - 0.000042037*t
+    perihelion = (102.93735 + 1.71946*t) * _RAD
+    # the earth moves 90 degrees behind the sun's longitude, along the ecliptic
+    vx = _KAPPA * (math.sin(longitude) + e*math.sin(perihelion))
+    vy = -_KAPPA * (math.cos(longitude) + e*math.cos(perihelion))
+    eps = nutation(dt)[2]
+    return np.array([vx, vy*math.cos(eps), vy*math.sin(eps)])
+
+
+def _add_aberration(vector, velocity):
+    "Returns unit vectors of shape (3, ...) displaced towards velocity"
+    moved = vector + velocity.reshape((3,) + (1,)*(vector.ndim - 1))
+    return moved / np.linalg.norm(moved, axis=0)
+
+
+def _remove_aberration(vector, velocity):
+    "Returns unit vectors of shape (3, ...) which _add_aberration displaces to the given vectors"
+    # the displacement is some 20 arcseconds, so two iterations are ample
+    original = vector
+    for iteration in range(2):
+        original = original + (vector - _add_aberration(original, velocity))
+    return original / np.linalg.norm(original, axis=0)
+
+
+def sidereal_time(dt, longitude):
+    "Returns the local apparent sidereal time in degrees at dt, for the given east longitude in degrees"
+    jd = julian_date(dt)
+    t = (jd - _J2000) / 36525.0
+    gmst = 280.46061837 + 360.98564736629*(jd - _J2000) + 0.000387933*t*t - t*t*t/38710000.0
+    # the equation of the equinoxes
+    dpsi, deps, eps = nutation(dt)
+    gast = gmst + math.degrees(dpsi * math.cos(eps + deps))
+    return (gast + longitude) % 360.0
+
+
+def icrs_to_precessed(ra, dec, dt):
+    "Returns ra, dec of the mean equator and equinox of dt, with aberration, as astropy's PrecessedGeocentric"
+    vector = _add_aberration(_unit_vector(ra, dec), _aberration(dt))
+    return _ra_dec(np.tensordot(precession_matrix(dt), vector, axes=1))
+
+
+def precessed_to_icrs(ra, dec, dt, aberration=True):
+    """Returns ra, dec converting icrs_to_precessed ra, dec back, with aberration False, only the precession
+       is undone, giving the geocentric ra, dec of planets, as astropy's GCRS"""
+    vector = np.tensordot(precession_matrix(dt).T, _unit_vector(ra, dec), axes=1)
+    if aberration:
+        vector = _remove_aberration(vector, _aberration(dt))
+    return _ra_dec(vector)
+
+
+def _apparent(ra, dec, dt, aberration):
+    "Returns unit vectors of the true equator and equinox of dt, for ra, dec"
+    vector = _unit_vector(ra, dec)
+    if aberration:
+        vector = _add_aberration(vector, _aberration(dt))
+    return np.tensordot(nutation_matrix(dt) @ precession_matrix(dt), vector, axes=1)
+
+
+def refraction(alt, pressure=1010.0, temperature=10.0):
+    """Returns the refraction in degrees, to be added to the true altitude alt in degrees, for the
+       given pressure in hPa and temperature in Celsius, by Saemundsson's formula, to about 0.1 arcminute"""
+    alt = np.asarray(alt, dtype=float)
+    h = np.maximum(alt, -1.0)
+    arcminutes = 1.02 / np.tan(np.radians(h + 10.3/(h + 5.11)))
+    return arcminutes / 60.0 * (pressure / 1010.0) * (283.0 / (273.0 + temperature))
+
+
+def icrs_to_altaz(ra, dec, dt, longitude, latitude, pressure=0.0, temperature=10.0, aberration=True):
+    """Returns alt, az in degrees, az east of north, of ra, dec at dt seen from longitude, latitude.
+       Refraction is added for a pressure in hPa above zero, as astropy's AltAz, the default of zero
+       giving the unrefracted altitude. With aberration False, ra, dec are taken as geocentric,
+       as astropy's GCRS positions of planets"""
+    x, y, z = _apparent(ra, dec, dt, aberration)
+    # hour angle and declination of date
+    hour_angle = np.radians(sidereal_time(dt, longitude)) - np.arctan2(y, x)
+    declination = np.arctan2(z, np.hypot(x, y))
+    phi = math.radians(latitude)
+    alt = np.degrees(np.arcsin(np.clip(math.sin(phi)*np.sin(declination) + math.cos(phi)*np.cos(declination)*np.cos(hour_angle), -1.0, 1.0)))
+    az = np.mod(np.degrees(np.arctan2(-np.cos(declination)*np.sin(hour_angle),
+                                      np.sin(declination)*math.cos(phi) - np.cos(declination)*math.sin(phi)*np.cos(hour_angle))), 360.0)
+    if pressure > 0.0:
+        alt = alt + refraction(alt, pressure, temperature)
+    return alt, az
+
+
+def altaz_to_icrs(alt, az, dt, longitude, latitude, aberration=True):
+    "Returns ra, dec in degrees of the unrefracted alt, az in degrees, az east of north, at dt seen from longitude, latitude"
+    alt = np.radians(alt)
+    az = np.radians(az)
+    phi = math.radians(latitude)
+    declination = np.arcsin(np.clip(math.sin(phi)*np.sin(alt) + math.cos(phi)*np.cos(alt)*np.cos(az), -1.0, 1.0))
+    hour_angle = np.arctan2(-np.cos(alt)*np.sin(az), np.sin(alt)*math.cos(phi) - np.cos(alt)*math.sin(phi)*np.cos(az))
+    right_ascension = np.radians(sidereal_time(dt, longitude)) - hour_angle
+    vector = np.array([np.cos(declination)*np.cos(right_ascension), np.cos(declination)*np.sin(right_ascension), np.sin(declination)])
+    vector = np.tensordot((nutation_matrix(dt) @ precession_matrix(dt)).T, vector, axes=1)
+    if aberration:
+        vector = _remove_aberration(vector, _aberration(dt))
+    return _ra_dec(vector)
+
+def offset_by(ra, dec, position_angle, separation):
+    "Returns ra, dec of the point separation degrees from ra, dec, in the direction position_angle degrees east of north"
+    ra, dec, position_angle, separation = np.radians(ra), np.radians(dec), np.radians(position_angle), np.radians(separation)
+    newdec = np.arcsin(np.clip(np.sin(dec)*np.cos(separation) + np.cos(dec)*np.sin(separation)*np.cos(position_angle), -1.0, 1.0))
+    newra = ra + np.arctan2(np.sin(position_angle)*np.sin(separation)*np.cos(dec), np.cos(separation) - np.sin(dec)*np.sin(newdec))
+    return np.mod(np.degrees(newra), 360.0), np.degrees(newdec)
+
+
+def position_angle(ra1, dec1, ra2, dec2):
+    "Returns the position angle in degrees, 0 to 360 east of north, of ra2, dec2 seen from ra1, dec1"
+    ra1, dec1, ra2, dec2 = np.radians(ra1), np.radians(dec1), np.radians(ra2), np.radians(dec2)
+    angle = np.arctan2(np.sin(ra2 - ra1)*np.cos(dec2), np.cos(dec1)*np.sin(dec2) - np.sin(dec1)*np.cos(dec2)*np.cos(ra2 - ra1))
+    angle = np.mod(np.degrees(angle), 360.0)
+    # the modulus of a very small negative angle rounds to 360
+    return np.where(angle < 360.0, angle, 0.0)
+
+
+
+if __name__ == "__main__":
+
+    # time the engine against astropy, the comparison of their positions is tests/test_coords.py
+
+    import time
+
+    import astropy.units as u
+    from astropy.coordinates import SkyCoord, EarthLocation, AltAz
+    from astropy.time import Time
+
+    from .cfg import observatory
+
+    longitude, latitude, elevation = observatory()
+    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+
+    dt = datetime.utcnow()
+    tstamp = Time(dt, format='datetime', scale='utc')
+    start = time.perf_counter()
+    for n in range(100):
+        icrs_to_altaz(83.63, 22.01, dt, longitude, latitude)
+    print(f"icrs_to_altaz {(time.perf_counter() - start)*10:.3f} ms per position")
+    start = time.perf_counter()
+    for n in range(10):
+        SkyCoord(83.63*u.deg, 22.01*u.deg, frame='icrs').transform_to(AltAz(obstime=tstamp, location=astro_centre))
+    print(f"astropy AltAz {(time.perf_counter() - start)*100:.3f} ms per position")
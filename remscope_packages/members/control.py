@@ -5,6 +5,8 @@
 #
 ##################################
 
+import math
+
 from datetime import datetime, timezone, timedelta
 from collections import namedtuple
 from struct import pack, unpack
@@ -26,11 +28,11 @@ from astroquery.exceptions import InvalidQueryError
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from .. import redis_ops
+from .. import redis_ops, coords
 
-from ..cfg import observatory, get_planetdb, planetmags
+from ..cfg import observatory, get_planetdb, planetmags, chart_refresh_fraction
 from ..sun import night_slots, Slot
-from ..stars import get_stars, xy_constellation_lines, get_planets, get_named_object, chartpositions
+from ..stars import get_named_object, chart_payload, chart_time
 
 from .sessions import livesession, doorsession
 
@@ -45,13 +47,10 @@ def get_parked_radec():
     "Returns Position object of the parked position"
     # now work out ra dec
     alt,az = _PARKED
-    solar_system_ephemeris.set('jpl')
     longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
-    altazcoord = SkyCoord(alt=alt*u.deg, az=az*u.deg, obstime = Time(datetime.utcnow(), format='datetime', scale='utc'), location = astro_centre, frame = 'altaz')
-    # transform to ra, dec
-    sc = altazcoord.transform_to('icrs')
-    return Position(sc.ra.degree, sc.dec.degree)
+    # transform to ra, dec, for display only, so the fast coords module is used rather than astropy
+    ra, dec = coords.altaz_to_icrs(alt, az, datetime.utcnow(), longitude, latitude)
+    return Position(float(ra), float(dec))
 
 
 def get_wanted_position(rconn_0, rconn):
@@ -70,6 +69,31 @@ def get_chart(rconn_0, rconn):
     return Chart(*redis_ops.get_chart_parameters(rconn_0, rconn))
 
 
+def _chart_state(ra, dec, chart, tstamp):
+    "Returns a tuple (ra, dec, view, flip, rot, planettime) describing the chart drawn"
+    return (ra, dec, chart.view, chart.flip, chart.rot, chart_time(chart.view, tstamp).strftime("%Y%m%d%H%M"))
+
+
+def _set_chart_state(skicall, state):
+    "Records the chart state sent to this session"
+    redis_ops.set_chart_rendered(skicall.call_data.get('cookie'), state, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+
+
+def _chart_unchanged(skicall, state):
+    """Returns True if the chart last sent to this session has the same view, flip, rot and planet time
+       as state, and its centre is within chart_refresh_fraction of the view of the state centre"""
+    last = redis_ops.get_chart_rendered(skicall.call_data.get('cookie'), skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
+    if last is None:
+        return False
+    ra, dec, view, flip, rot, planettime = state
+    if (view, flip, rot, planettime) != last[2:]:
+        return False
+    # offset of the centre in degrees, allowing for ra wrapping at 360
+    d_ra = ((ra - last[0] + 180.0) % 360.0 - 180.0) * math.cos(math.radians(dec))
+    d_dec = dec - last[1]
+    return math.hypot(d_ra, d_dec) < chart_refresh_fraction() * view
+
+
 # livesession allows the booked in user to access the controls, but only
 # if the door is open
 @livesession
@@ -134,22 +158,17 @@ DEC: {act_dec}
     # set the transform on the widget
     page_data['starchart', 'transform'] = _transform(chart.flip, chart.rot)
 
-    if view>10.0:
-        page_data['starchart', 'lines'] = list(xy_constellation_lines(ra, dec, view))
-
-    stars, scale, const = get_stars(ra, dec, view)
+    # get the chart lines, stars and planets, which are cached
+    payload = chart_payload(ra, dec, view, tstamp, skicall.proj_data.get("rconn_5"), skicall.proj_data.get("rconn"))
 
-    # the planets database are created at 30 minutes past the hour, so get the planets for this hour
-    planets = get_planets(tstamp, dec, view, scale, const)
-
-    if planets:
-        stars.extend(planets)
+    if view>10.0:
+        page_data['starchart', 'lines'] = payload['lines']
 
-    # convert stars ra, dec, to xy positions on the chart
-    stars = chartpositions(stars, ra, dec, view)
+    if payload['stars']:
+        page_data['starchart', 'stars'] = payload['stars']
 
-    if stars:
-        page_data['starchart', 'stars'] = stars
+    # record the chart sent, so refresh_chart need not send it again while the telescope is still
+    _set_chart_state(skicall, _chart_state(ra, dec, chart, tstamp))
 
     if actual:
         page_data['display_target', 'button_text'] = "Display target"
@@ -184,7 +203,8 @@ DEC: {act_dec}
 @livesession
 def refresh_chart(skicall):
     """Function to refresh the chart by json page interval call, if this is for the target, only the alt az values
-       are changed, however if it is for the actual position, the whole chart is redone"""
+       are changed, however if it is for the actual position, the whole chart is redone, unless the
+       telescope has moved less than chart_refresh_fraction of the view since the chart was last sent"""
 
     actual = redis_ops.get_chart_actual(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
     # True if the chart showing actual positions rather than target position
@@ -200,19 +220,18 @@ def refresh_chart(skicall):
             view = chart.view
         except:
             raise FailPage("Invalid view")
-        # set the transform on the widget
-        page_data['starchart', 'transform'] = _transform(chart.flip, chart.rot)
-        if view>10.0:
-            page_data['starchart', 'lines'] = list(xy_constellation_lines(ra, dec, view))
-        stars, scale, const = get_stars(ra, dec, view)
-        # the planets database are created at 30 minutes past the hour, so get the planets for this hour
-        planets = get_planets(datetime.utcnow(), dec, view, scale, const)
-        if planets:
-            stars.extend(planets)
-        # convert stars ra, dec, to xy positions on the chart
-        stars = chartpositions(stars, ra, dec, view)
-        if stars:
-            page_data['starchart', 'stars'] = stars
+        tstamp = datetime.utcnow()
+        state = _chart_state(ra, dec, chart, tstamp)
+        if not _chart_unchanged(skicall, state):
+            # set the transform on the widget
+            page_data['starchart', 'transform'] = _transform(chart.flip, chart.rot)
+            # get the chart lines, stars and planets, which are cached
+            payload = chart_payload(ra, dec, view, tstamp, skicall.proj_data.get("rconn_5"), skicall.proj_data.get("rconn"))
+            if view>10.0:
+                page_data['starchart', 'lines'] = payload['lines']
+            if payload['stars']:
+                page_data['starchart', 'stars'] = payload['stars']
+            _set_chart_state(skicall, state)
         if status:
             act_ra = Angle(ra*u.deg).to_string(unit=u.hour, sep=':')
             act_dec = Angle(dec*u.deg).to_string(unit=u.degree, sep=':')
@@ -535,8 +554,8 @@ def up_arrow(skicall):
         newrot = newrot+360
 
     # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
+    ra = newtarget.ra
+    dec = newtarget.dec
     redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
 
     # save the new chart parameters
@@ -585,8 +604,8 @@ def left_arrow(skicall):
         newrot = newrot+360
 
     # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
+    ra = newtarget.ra
+    dec = newtarget.dec
     redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
 
     # save the new chart parameters
@@ -635,8 +654,8 @@ def right_arrow(skicall):
         newrot = newrot+360
 
     # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
+    ra = newtarget.ra
+    dec = newtarget.dec
     redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
 
     # save the new chart parameters
@@ -678,8 +697,8 @@ def down_arrow(skicall):
         newrot = newrot+360
 
     # set these wanted coordinates into redis
-    ra = newtarget.ra.degree
-    dec = newtarget.dec.degree
+    ra = newtarget.ra
+    dec = newtarget.dec
     redis_ops.set_wanted_position(ra, dec, skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
 
     # save the new chart parameters
@@ -694,25 +713,18 @@ def down_arrow(skicall):
 
 
 def _new_ra_dac(ra, dec, position_angle, separation):
-    "Returns new SkyCoord and position angle back to initial ra, dec given ra,dec, position_angle and separation"
+    "Returns new Position and position angle back to initial ra, dec given ra,dec, position_angle and separation"
 
     if position_angle>=360:
         position_angle = position_angle-360
     if position_angle<0:
         position_angle = position_angle+360
 
-    try:
-        target = SkyCoord(ra*u.deg, dec*u.deg, frame='icrs')
-    except Exception:
-        raise FailPage("Unable to determine astropy.coordinates.SkyCoord")
-
-    position_angle = position_angle * u.deg
-    separation = separation * u.deg
-    newskycoord = target.directional_offset_by(position_angle, separation)
+    newra, newdec = coords.offset_by(ra, dec, position_angle, separation)
 
-    backpositionangle = newskycoord.position_angle(target)
+    backpositionangle = coords.position_angle(newra, newdec, ra, dec)
 
-    return newskycoord, int(backpositionangle.deg)
+    return Position(float(newra), float(newdec)), int(backpositionangle)
 
 
 @livesession
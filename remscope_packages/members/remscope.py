@@ -15,7 +15,7 @@ from astroquery.exceptions import InvalidQueryError
 
 from skipole import FailPage, GoTo, ValidateError, ServerError
 
-from .. import sun, stars, database_ops, redis_ops, cfg
+from .. import sun, stars, database_ops, redis_ops, cfg, coords
 
 from indi_mr import tools
 
@@ -43,13 +43,10 @@ def get_parked_radec():
     "Returns Position object of the parked position"
     # now work out ra dec
     alt,az = _PARKED
-    solar_system_ephemeris.set('jpl')
     longitude, latitude, elevation = cfg.observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
-    altazcoord = SkyCoord(alt=alt*u.deg, az=az*u.deg, obstime = Time(datetime.utcnow(), format='datetime', scale='utc'), location = astro_centre, frame = 'altaz')
-    # transform to ra, dec
-    sc = altazcoord.transform_to('icrs')
-    return Position(sc.ra.degree, sc.dec.degree)
+    # transform to ra, dec, for display only, so the fast coords module is used rather than astropy
+    ra, dec = coords.altaz_to_icrs(alt, az, datetime.utcnow(), longitude, latitude)
+    return Position(float(ra), float(dec))
 
 
 def create_index(skicall):
@@ -231,23 +228,19 @@ def get_actual_position(skicall):
         # all properties have been found
         return True, Position(ra_act, dec_act), (alt_act, az_act)
 
-    # one or both are missing so need to be able to calculate properties
-    solar_system_ephemeris.set('jpl')
+    # one or both are missing so need to be able to calculate properties, these are for display
+    # and are calculated on every refresh, so the fast coords module is used rather than astropy
     longitude, latitude, elevation = cfg.observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
     if 'EQUATORIAL_COORD' in properties_list:
         # 'HORIZONTAL_COORD' is missing so calculate them from equatorial coords
-        target = SkyCoord(ra_act*u.deg, dec_act*u.deg, frame='icrs')
-        target_altaz = target.transform_to(AltAz(obstime = targettime, location = astro_centre))
-        return True, Position(ra_act, dec_act), (target_altaz.alt.degree, target_altaz.az.degree)
+        alt, az = coords.icrs_to_altaz(ra_act, dec_act, targettime.datetime, longitude, latitude)
+        return True, Position(ra_act, dec_act), (float(alt), float(az))
 
     if 'HORIZONTAL_COORD' in properties_list:
         # 'EQUATORIAL_COORD' is missing so calculate them from horizontal coords
-        target = SkyCoord(alt=alt_act*u.deg, az=az_act*u.deg, obstime = targettime, location = astro_centre, frame = 'altaz')
-        # transform to ra, dec
-        target_eq = target.transform_to('icrs')
-        return True, Position(target_eq.ra.degree, target_eq.dec.degree), (alt_act, az_act)
+        ra, dec = coords.altaz_to_icrs(alt_act, az_act, targettime.datetime, longitude, latitude)
+        return True, Position(float(ra), float(dec)), (alt_act, az_act)
 
     # so neither EQUATORIAL_COORD or HORIZONTAL_COORD are in the properties list
 
@@ -264,21 +257,22 @@ def get_actual_position(skicall):
     dec = dec_dict['float_number']
     targettime = Time(ra_dict['timestamp'], format='isot', scale='utc')
 
+    # the precessed coordinates include aberration, so with the precession undone, they are geocentric
+    gcrs_ra, gcrs_dec = coords.precessed_to_icrs(ra, dec, targettime.datetime, aberration=False)
+
     target_frame = redis_ops.get_target_frame(skicall.proj_data.get("rconn_0"), skicall.proj_data.get("rconn"))
     if target_frame == 'icrs':
-        # undo the precession calculation to get icrs back
-        target = SkyCoord(ra*u.deg, dec*u.deg, obstime = targettime, equinox=targettime, frame='precessedgeocentric')
-        target_eq = target.transform_to(frame ='icrs')
+        # undo the precession and aberration to get icrs back
+        ra_eq, dec_eq = coords.precessed_to_icrs(ra, dec, targettime.datetime)
     elif target_frame == 'gcrs':
-        # this is used for planets and minor planets
-        target = SkyCoord(ra*u.deg, dec*u.deg, obstime = targettime, equinox=targettime, frame='precessedgeocentric')
-        target_eq = target.transform_to(frame ='gcrs')
+        # this is used for planets and minor planets, undo the precession only
+        ra_eq, dec_eq = gcrs_ra, gcrs_dec
     else:
         return False, get_parked_radec(), _PARKED
 
-    target_altaz = target.transform_to(AltAz(obstime = targettime, location = astro_centre))
+    alt, az = coords.icrs_to_altaz(gcrs_ra, gcrs_dec, targettime.datetime, longitude, latitude, aberration=False)
 
-    return True, Position(target_eq.ra.degree, target_eq.dec.degree), (target_altaz.alt.degree, target_altaz.az.degree)
+    return True, Position(float(ra_eq), float(dec_eq)), (float(alt), float(az))
 
 
 def set_target(skicall, target_ra, target_dec, target_name):
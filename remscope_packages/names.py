@@ -0,0 +1,118 @@
+"""Resolves object names, such as M45 or Vega, to ICRS positions, remembering each answer in the
+sqlite database astrodata/names.db, so the planning pages, which look up the same name for the
+detail, printout and finder pages, make the slow network query once.
+
+A name found is remembered for name_cache_days, and a name not found for name_miss_hours, as set
+in cfg.py. If the resolver cannot be reached, a remembered position is used even if it has expired,
+and nothing is remembered, so the name is queried again on the next call.
+
+The resolver, by default a Sesame query through astropy, can be replaced by calling set_resolver,
+so tests and offline installations can use a local stand-in."""
+
+import sqlite3, threading, time
+
+from astropy import units as u
+from astropy.coordinates import SkyCoord, name_resolve
+
+from .cfg import get_namesdb, name_cache_days, name_miss_hours
+
+
+# The table NAMES has a row for each name queried, RA and DEC are NULL if the name was not found,
+# and RESOLVED is the time of the query in seconds since the epoch
+_NAMES_TABLE = """CREATE TABLE IF NOT EXISTS NAMES(NAME TEXT PRIMARY KEY,
+                                                  RA REAL,
+                                                  DEC REAL,
+                                                  RESOLVED REAL)"""
+
+_connections = threading.local()
+
+
+def sesame(name):
+    """The default resolver, returns (ra, dec) in degrees of the named object, or None if it is
+       not found, and raises NameResolveError if the Sesame services cannot be reached"""
+    try:
+        target = SkyCoord.from_name(name)
+    except name_resolve.NameResolveError as e:
+        # astropy raises the same exception when every service fails, which is not an answer
+        if str(e).startswith("All Sesame queries failed"):
+            raise
+        return
+    return target.ra.degree, target.dec.degree
+
+
+# the resolver in use, a callable taking a name, and returning (ra, dec) in degrees, or None if
+# the name is not found, and raising an exception if the answer could not be obtained
+_RESOLVER = [sesame]
+
+
+def set_resolver(resolver):
+    """Sets the callable used to resolve names not already remembered, or restores the Sesame
+       resolver if resolver is None"""
+    _RESOLVER[0] = sesame if resolver is None else resolver
+
+
+def _connection():
+    "Returns this thread's connection to the names database, creating the database if necessary"
+    con = getattr(_connections, 'con', None)
+    if con is None:
+        con = sqlite3.connect(get_namesdb(), timeout=5)
+        # readers are not blocked while another thread or process records a name
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(_NAMES_TABLE)
+        con.commit()
+        _connections.con = con
+    return con
+
+
+def _key(name):
+    "Returns the name as stored, case and spacing are not significant"
+    return " ".join(name.split()).lower()
+
+
+def _remembered(key):
+    "Returns (ra, dec, resolved) of the row for key, or None if there is no row"
+    try:
+        return _connection().execute("SELECT RA, DEC, RESOLVED FROM NAMES WHERE NAME=?", (key,)).fetchone()
+    except sqlite3.Error:
+        return
+
+
+def _remember(key, position):
+    "Records position, or None if the name was not found, against key"
+    ra, dec = position if position is not None else (None, None)
+    try:
+        con = _connection()
+        with con:
+            con.execute("INSERT OR REPLACE INTO NAMES VALUES (?, ?, ?, ?)", (key, ra, dec, time.time()))
+    except sqlite3.Error:
+        # failing to remember only means the name is queried again
+        pass
+
+
+def resolve(name):
+    "Returns an ICRS SkyCoord of the named object, or None if it is not found"
+    key = _key(name)
+    if not key:
+        return
+    row = _remembered(key)
+    if row is not None:
+        ra, dec, resolved = row
+        if ra is None:
+            lifetime = name_miss_hours() * 3600
+        else:
+            lifetime = name_cache_days() * 86400
+        if time.time() - resolved < lifetime:
+            if ra is None:
+                return
+            return SkyCoord(ra*u.deg, dec*u.deg, frame='icrs')
+    try:
+        position = _RESOLVER[0](name)
+    except Exception:
+        # the resolver is unreachable, use an expired position rather than none
+        if row is None or row[0] is None:
+            return
+        return SkyCoord(row[0]*u.deg, row[1]*u.deg, frame='icrs')
+    _remember(key, position)
+    if position is None:
+        return
+    return SkyCoord(position[0]*u.deg, position[1]*u.deg, frame='icrs')
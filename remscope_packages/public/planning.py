@@ -16,6 +16,8 @@ from skipole import FailPage, GoTo, ValidateError, ServerError, PageData, Sectio
 Target = namedtuple('Target', ['target_name', 'planning_date', 'target_datetime', 'str_date', 'str_time', 'ra', 'dec', 'alt', 'az',
                                'ra_hr', 'ra_min', 'ra_sec', 'dec_sign', 'dec_deg', 'dec_min', 'dec_sec', 'view', 'flip', 'rot'])
 
+Position = namedtuple('Position', ['ra', 'dec'])
+
 
 
 import astropy.units as u
@@ -24,7 +26,8 @@ from astropy.time import Time
 
 from ..cfg import observatory, get_planetdb, planetmags, get_astrodata_directory
 from ..sun import Slot
-from ..stars import get_stars, xy_constellation_lines, get_planets, get_named_object_slots, get_unnamed_object_slots, get_named_object_intervals, get_unnamed_object_intervals, chartpositions
+from .. import coords
+from ..stars import get_named_object_slots, get_unnamed_object_slots, get_named_object_intervals, get_unnamed_object_intervals, chart_payload, get_planet_position
 
 # These are mean apparant visual magnitudes, except for pluto, which is a rough guesstimate
 
@@ -1191,7 +1194,7 @@ def set_view(skicall):
 
 
 def _new_ra_dac(ra, dec, position_angle, separation):
-    "Returns new SkyCoord and position angle back to initial ra, dec given ra,dec, position_angle and separation"
+    "Returns new Position and position angle back to initial ra, dec given ra,dec strings, position_angle and separation"
 
     if position_angle>=360:
         position_angle = position_angle-360
@@ -1199,17 +1202,15 @@ def _new_ra_dac(ra, dec, position_angle, separation):
         position_angle = position_angle+360
 
     try:
-        target = SkyCoord(ra, dec, frame='icrs')
+        ra, dec = Angle(ra).deg, Angle(dec).deg
     except Exception:
-        raise FailPage("Unable to determine astropy.coordinates.SkyCoord")
+        raise FailPage("Unable to parse coordinates")
 
-    position_angle = position_angle * u.deg
-    separation = separation * u.deg
-    newskycoord = target.directional_offset_by(position_angle, separation)
+    newra, newdec = coords.offset_by(ra, dec, position_angle, separation)
 
-    backpositionangle = newskycoord.position_angle(target)
+    backpositionangle = coords.position_angle(newra, newdec, ra, dec)
 
-    return newskycoord, int(backpositionangle.deg)
+    return Position(float(newra), float(newdec)), int(backpositionangle)
 
 
 def up_arrow(skicall):
@@ -1247,13 +1248,11 @@ def up_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
     # longitude, latitude, elevation of the astronomy centre
     longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
     newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot, separation)
-    newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
+    newra, newdec = newtarget.ra, newtarget.dec
     # rotate the diagram
     newrot = backangle - 180
     if newrot > 360:
@@ -1270,10 +1269,10 @@ def up_arrow(skicall):
     call_data['stored_values']['target_ra'] = "{}h{}m{:2.1f}s".format(rahr, ramin, rasec)
 
     thisdate_time = storedtarget.target_datetime
-    time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
-    call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
-    call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
+    # alt and az are for display, so the fast coords module is used rather than astropy
+    newalt, newaz = coords.icrs_to_altaz(newra, newdec, thisdate_time, longitude, latitude)
+    call_data['stored_values']['target_alt'] = "{:3.2f}".format(float(newalt))
+    call_data['stored_values']['target_az'] = "{:3.2f}".format(float(newaz))
 
     call_data['stored_values']['back'] = 30104
     call_data['stored_values']['target_name'] = 'none'
@@ -1316,19 +1315,17 @@ def left_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
     # longitude, latitude, elevation of the astronomy centre
     longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
     if storedtarget.flip:
         newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot-90, separation)
-        newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
+        newra, newdec = newtarget.ra, newtarget.dec
         # rotate the diagram
         newrot = backangle-90
     else:
         newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot+90, separation)
-        newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
+        newra, newdec = newtarget.ra, newtarget.dec
         # rotate the diagram
         newrot = backangle+90
 
@@ -1344,10 +1341,10 @@ def left_arrow(skicall):
     call_data['stored_values']['target_ra'] = "{}h{}m{:2.1f}s".format(rahr, ramin, rasec)
 
     thisdate_time = storedtarget.target_datetime
-    time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
-    call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
-    call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
+    # alt and az are for display, so the fast coords module is used rather than astropy
+    newalt, newaz = coords.icrs_to_altaz(newra, newdec, thisdate_time, longitude, latitude)
+    call_data['stored_values']['target_alt'] = "{:3.2f}".format(float(newalt))
+    call_data['stored_values']['target_az'] = "{:3.2f}".format(float(newaz))
 
     call_data['stored_values']['back'] = 30104
     call_data['stored_values']['target_name'] = 'none'
@@ -1391,19 +1388,17 @@ def right_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
     # longitude, latitude, elevation of the astronomy centre
     longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
     if storedtarget.flip:
         newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot+90, separation)
-        newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
+        newra, newdec = newtarget.ra, newtarget.dec
         # rotate the diagram
         newrot = backangle+90
     else:
         newtarget, backangle = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot-90, separation)
-        newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
+        newra, newdec = newtarget.ra, newtarget.dec
         # rotate the diagram
         newrot = backangle-90
 
@@ -1419,10 +1414,10 @@ def right_arrow(skicall):
     call_data['stored_values']['target_ra'] = "{}h{}m{:2.1f}s".format(rahr, ramin, rasec)
 
     thisdate_time = storedtarget.target_datetime
-    time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
-    call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
-    call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
+    # alt and az are for display, so the fast coords module is used rather than astropy
+    newalt, newaz = coords.icrs_to_altaz(newra, newdec, thisdate_time, longitude, latitude)
+    call_data['stored_values']['target_alt'] = "{:3.2f}".format(float(newalt))
+    call_data['stored_values']['target_az'] = "{:3.2f}".format(float(newaz))
 
     call_data['stored_values']['back'] = 30104
     call_data['stored_values']['target_name'] = 'none'
@@ -1465,13 +1460,11 @@ def down_arrow(skicall):
     if rot == 360:
         rot = 0
 
-    solar_system_ephemeris.set('jpl')
     # longitude, latitude, elevation of the astronomy centre
     longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
     newtarget, newrot = _new_ra_dac(storedtarget.ra, storedtarget.dec, rot+180, separation)
-    newra, newdec = Angle(newtarget.ra).deg, Angle(newtarget.dec).deg
+    newra, newdec = newtarget.ra, newtarget.dec
 
     # rotate the diagram
     call_data['stored_values']['rot'] = newrot
@@ -1482,10 +1475,10 @@ def down_arrow(skicall):
     call_data['stored_values']['target_ra'] = "{}h{}m{:2.1f}s".format(rahr, ramin, rasec)
 
     thisdate_time = storedtarget.target_datetime
-    time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
-    call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
-    call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
+    # alt and az are for display, so the fast coords module is used rather than astropy
+    newalt, newaz = coords.icrs_to_altaz(newra, newdec, thisdate_time, longitude, latitude)
+    call_data['stored_values']['target_alt'] = "{:3.2f}".format(float(newalt))
+    call_data['stored_values']['target_az'] = "{:3.2f}".format(float(newaz))
 
     call_data['stored_values']['back'] = 30104
     call_data['stored_values']['target_name'] = 'none'
@@ -1537,20 +1530,14 @@ def _draw_finder(skicall):
     # set the transform on the widget
     page_data['starchart', 'transform'] = _transform(storedtarget.flip, storedtarget.rot)
 
-    if view>10.0:
-        page_data['starchart', 'lines'] = list(xy_constellation_lines(ra, dec, view))
-
-    stars, scale, const = get_stars(ra, dec, view)
-    planets = get_planets(thisdate_time, dec, view, scale, const)
+    # get the chart lines, stars and planets, which are cached
+    payload = chart_payload(ra, dec, view, thisdate_time, skicall.proj_data.get("rconn_5"), skicall.proj_data.get("rconn"))
 
-    if planets:
-        stars.extend(planets)
-
-    # convert stars ra, dec, to xy positions on the chart
-    stars = chartpositions(stars, ra, dec, view)
+    if view>10.0:
+        page_data['starchart', 'lines'] = payload['lines']
 
-    if stars:
-        page_data['starchart', 'stars'] = stars
+    if payload['stars']:
+        page_data['starchart', 'stars'] = payload['stars']
 
     if call_data['json_requested']:
         # set header text into page_data, otherwise set it into call_data for the end_call function to sort out
@@ -1643,20 +1630,14 @@ Elevation: {:2.1f} meters""".format(storedtarget.ra,
     # set the transform
     page_data['starchart', 'transform'] = _transform(storedtarget.flip, storedtarget.rot)
 
-    if view>10.0:
-        page_data['starchart', 'lines'] = list(xy_constellation_lines(ra, dec, view))
-
-    stars, scale, const = get_stars(ra, dec, view)
-    planets = get_planets(thisdate_time, dec, view, scale, const)
-
-    if planets:
-        stars.extend(planets)
+    # get the chart lines, stars and planets, which are cached
+    payload = chart_payload(ra, dec, view, thisdate_time, skicall.proj_data.get("rconn_5"), skicall.proj_data.get("rconn"))
 
-    # convert stars ra, dec, to xy positions on the chart
-    stars = chartpositions(stars, ra, dec, view)
+    if view>10.0:
+        page_data['starchart', 'lines'] = payload['lines']
 
-    if stars:
-        page_data['starchart', 'stars'] = stars
+    if payload['stars']:
+        page_data['starchart', 'stars'] = payload['stars']
 
 
 
@@ -1899,6 +1880,9 @@ def planets(skicall):
             # For this time and planet, read the database, and if the data is present, display it
             cur.execute('SELECT RA,DEC,ALT,AZ FROM POSITIONS WHERE DATEANDTIME=? AND NAME=?', (slot.midtime, planets[seq].lower()))
             planet_data = cur.fetchone()
+            if not planet_data:
+                # beyond the hourly positions, the polynomial segments cover a longer period
+                planet_data = get_planet_position(planets[seq].lower(), slot.midtime)
             if not planet_data:
                 skicall.page_data[sectionseq, 'ratext', 'tag_text'] = "RA: --"
                 skicall.page_data[sectionseq, 'dectext', 'tag_text'] = "DEC: --"
@@ -2081,10 +2065,8 @@ def callfinder(skicall):
     except:
         raise FailPage("Unable to parse coordinates")
 
-    solar_system_ephemeris.set('jpl')
     # longitude, latitude, elevation of the astronomy centre
     longitude, latitude, elevation = observatory()
-    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
     # reset rotation
     call_data['stored_values']['rot'] = 0
@@ -2097,16 +2079,11 @@ def callfinder(skicall):
     call_data['stored_values']['target_dec'] = "{}{}d{}m{:2.1f}s".format(decsign, decdeg, decmin, decsec)
     call_data['stored_values']['target_ra'] = "{}h{}m{:2.1f}s".format(rahr, ramin, rasec)
 
-    try:
-        newtarget = SkyCoord(newra * u.deg, newdec * u.deg, frame='icrs')
-    except Exception:
-        raise FailPage("Unable to determine astropy.coordinates.SkyCoord")
-
     thisdate_time = storedtarget.target_datetime
-    time = Time(thisdate_time.isoformat(sep=' '))
-    newtarget_altaz = newtarget.transform_to(AltAz(obstime = time, location = astro_centre))
-    call_data['stored_values']['target_alt'] = "{:3.2f}".format(newtarget_altaz.alt.degree)
-    call_data['stored_values']['target_az'] = "{:3.2f}".format(newtarget_altaz.az.degree)
+    # alt and az are for display, so the fast coords module is used rather than astropy
+    newalt, newaz = coords.icrs_to_altaz(newra, newdec, thisdate_time, longitude, latitude)
+    call_data['stored_values']['target_alt'] = "{:3.2f}".format(float(newalt))
+    call_data['stored_values']['target_az'] = "{:3.2f}".format(float(newaz))
 
     call_data['stored_values']['back'] = 30104
     call_data['stored_values']['target_name'] = 'none'
@@ -1,6 +1,6 @@
 
 
-import random
+import random, json
 
 from datetime import datetime
 
@@ -249,6 +249,66 @@ def set_chart_parameters(view, flip, rot, prefix='', rconn=None):
     return False
 
 
+def get_chart_payload(key_string, prefix='', rconn=None):
+    """Return the star chart payload dictionary saved with key_string, or None if not found"""
+    if rconn is None:
+        return
+    try:
+        payload = rconn.get(prefix+key_string)
+        if payload is None:
+            return
+        return json.loads(payload.decode('utf-8'))
+    except:
+        return
+
+
+def set_chart_payload(key_string, payload, prefix='', rconn=None):
+    """Saves the star chart payload dictionary with key_string, with an expiry time of 3600 seconds (one hour)
+       Return True on success, False on failure"""
+    if rconn is None:
+        return False
+    try:
+        result = rconn.set(prefix+key_string, json.dumps(payload), ex=3600)
+    except:
+        return False
+    if result:
+        return True
+    return False
+
+
+def get_chart_rendered(cookie_string, prefix='', rconn=None):
+    """Return the chart state last sent to the session with the given cookie_string,
+       as a tuple (ra, dec, view, flip, rot, planettime) or None if not found"""
+    if not cookie_string:
+        return
+    if rconn is None:
+        return
+    try:
+        state = rconn.get(prefix+'chart_rendered_'+cookie_string)
+        if state is None:
+            return
+        return tuple(json.loads(state.decode('utf-8')))
+    except:
+        return
+
+
+def set_chart_rendered(cookie_string, state, prefix='', rconn=None):
+    """Saves the chart state tuple (ra, dec, view, flip, rot, planettime) sent to the session with
+       the given cookie_string, with an expiry time of 7200 seconds (2 hours)
+       Return True on success, False on failure"""
+    if not cookie_string:
+        return False
+    if rconn is None:
+        return False
+    try:
+        result = rconn.set(prefix+'chart_rendered_'+cookie_string, json.dumps(state), ex=7200)
+    except:
+        return False
+    if result:
+        return True
+    return False
+
+
 def get_chart_actual(prefix='', rconn=None):
     """Return True if the chart is showing actual view, False if target view"""
     if rconn is None:
@@ -1,17 +1,23 @@
 
-import os, sys, sqlite3, math
+import os, sys, sqlite3, math, pathlib, threading, functools
 
-from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from collections import OrderedDict
+
+from datetime import timedelta, timezone
 
 from astropy import units as u
-from astropy.coordinates import SkyCoord, EarthLocation, AltAz, name_resolve, solar_system_ephemeris, get_body, Angle, PrecessedGeocentric, ICRS
+from astropy.coordinates import SkyCoord, EarthLocation, AltAz, solar_system_ephemeris, get_body, Angle, PrecessedGeocentric, ICRS, GCRS, CartesianRepresentation
 from astropy.time import Time
 from astroquery.mpc import MPC
 from astroquery.exceptions import InvalidQueryError
 from astropy_healpix import HEALPix
 import numpy as np
 
-from .cfg import observatory, get_planetdb, get_constellation_lines, get_star_catalogs_directory, planetmags
+from .cfg import observatory, get_planetdb, get_constellation_lines, get_star_catalogs_directory, planetmags, star_cache_bytes, chart_cache_entries, chart_star_budget, chart_decimals, catalog_threads, catalog_fanout_pixels
+
+from . import redis_ops, names
 
 from .sun import night_slots, Slot
 
@@ -21,6 +27,24 @@ starcatalogs = get_star_catalogs_directory()
 # dictionary of planet names and magnitudes
 _PLANETS = planetmags()
 
+# The star catalog, made by astrodata/builddb.py, is a single set of columnar numpy .npy files
+# which are memory mapped, so star data is read straight from the page cache:
+# GSC_xyz.npy - float32 Cartesian unit vectors, one row (x, y, z) per star
+# GSC_mag.npy - int16 magnitude in thousandths of a magnitude
+# GSC_index.npy - int64 offsets, the stars of nside 128 nested healpix pixel p are rows index[p] to index[p+1]
+# GSC_breakmags.npy - int16 magnitude breakpoints, in thousandths of a magnitude
+# GSC_breaks.npy - int64, breaks[p,j] is the first row of pixel p not brighter than breakmags[j]
+# Within each pixel the rows are sorted by magnitude, so the stars brighter than a limit are a prefix
+# of the pixel, and as pixels are nested, a pixel of any coarser nside is a run of nside 128 pixels
+
+_CATALOG_NSIDE = 128
+
+_COLUMNS = ("xyz", "mag", "index", "breakmags", "breaks")
+
+# holds the StarCatalog once loaded, or None if the columnar files are not available
+_CATALOG = {}
+
+# Older installations instead have three sqlite databases, used if the columnar files are not present
 # Each database has a single table 'stars" with columns (HP INTEGER, GSC_ID TEXT, RA REAL, DEC REAL, MAG REAL)
 # where HP is a healpix id
 
@@ -33,155 +57,484 @@ _HP192 = os.path.join(starcatalogs, "HP192.db")
 # database HP768.db has all stars, organised in 768 healpix pixels
 _HP768 = os.path.join(starcatalogs, "HP768.db")
 
-# HEALPix object with nside 2 and 48 pixels
-_hp48 = HEALPix(nside=np.int64(2), order='nested', frame=ICRS())
+# The levels of detail used to search the catalog, as (nside, HEALPix object, pixel size in degrees)
+# finest first. A view searches with the finest level whose pixels are no smaller than the view radius,
+# so only a few pixels are searched, and the stars read stay roughly proportional to the stars drawn
+_LEVELS = []
+for _nside in (128, 64, 32, 16, 8, 4, 2, 1):
+    _hpobject = HEALPix(nside=np.int64(_nside), order='nested', frame=ICRS())
+    _LEVELS.append((_nside, _hpobject, _hpobject.pixel_resolution.to_value(u.deg)))
 
-# HEALPix object with nside 4 and 192 pixels
-_hp192 = HEALPix(nside=np.int64(4), order='nested', frame=ICRS())
+# dictionary of nside to (HEALPix object, pixel size in degrees)
+_NSIDES = {_nside:(_hpobject, _pixelsize) for _nside, _hpobject, _pixelsize in _LEVELS}
 
-# HEALPix object with nside 8 and 768 pixels
-_hp768 = HEALPix(nside=np.int64(8), order='nested', frame=ICRS())
+# cone searches are made about a centre rounded to this fraction of the pixel size, with the radius
+# enlarged to cover the rounding, so charts with nearby centres share one cached search
+_CONE_QUANTUM = 1.0/32.0
 
+# the healpix cone search occasionally misses a pixel which only just reaches into the cone,
+# so the radius is also enlarged by this fraction of the pixel size
+_CONE_MARGIN = 0.05
 
-# given a view, query databases
+
+# given a view, query the catalog
 
 def get_stars(ra, dec, view):
     """ finds stars, around the given ra, dec within view degrees.
-        Return stars, scale, offset where scale and offset are used to calculate the svg circle diameter of a given magnitude
+        Return diameters, xyz, scale, offset where scale and offset are used to calculate the svg circle diameter of a given magnitude
         such that diameter = scale * magnitude + offset
-        stars is a set of [(d,ra,dec),...]
-        where d is the diameter to be plotted"""
+        diameters is a numpy array of the diameter to be plotted for each star
+        and xyz a numpy array with a row of Cartesian unit vector (x, y, z) for each star"""
     # the views dictionary is a global dictionary defined below
     for v in views:
         if view>v:
-            # call the query function
-            # the q function is views[v][0]
-            # and magnitude limit is views[v][1]
-            scale = 0.0505*views[v][1] -1.2726          # these map scale/offset to the cutoff magnitude of the chart
-            offset = 0.3667*views[v][1] + 3.6543        # constants found by emperical observation of what looks nice
-            # call the query function
-            return views[v][0]( ra, dec, view, scale, offset, views[v][1])
-
-
-# query functions, each calls a different database catalogue (or set of catalogs)
-
-def q1( ra, dec, view, mag_scale, mag_offset, mag_limit):
-    "Gets stars in the _HP48 database which are brighter than the mag_limit"
-    radius = view/2.0
-    hp_to_search = tuple(_hp48.cone_search_skycoord(SkyCoord(ra=ra*u.deg, dec=dec*u.deg), radius=radius * u.deg))
-    try:
-        con = sqlite3.connect(_HP48, detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        if len(hp_to_search) > 1:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP in {hp_to_search} and MAG < {mag_limit}" )
+            # the magnitude limit is views[v]
+            mag_limit = views[v]
+            radius = view/2.0
+            bright = _bright_stars()
+            if (mag_limit <= _BRIGHT_LIMIT) and (bright is not None):
+                # a wide view, answered from the resident bright stars, which are sorted by magnitude
+                # so the stars brighter than mag_limit are a prefix of the arrays
+                xyz, mag = bright
+                n = int(np.searchsorted(mag, int(round(mag_limit * 1000))))
+                xyz, mag = _in_cone(xyz[:n], mag[:n], ra, dec, radius)
+                budget = chart_star_budget()
+                if len(mag) > budget:
+                    # already sorted, so the brightest are the first budget stars
+                    mag_limit = min(float(mag[budget]) / 1000.0, mag_limit)
+                    n = int(np.searchsorted(mag, mag[budget]))
+                    xyz, mag = xyz[:n], mag[:n]
+                scale, offset = _diameter_mapping(mag_limit)
+                return scale * mag / 1000.0 + offset, xyz, scale, offset
+            catalog = _star_catalog()
+            if catalog is None:
+                xyz, mag = _database_stars(float(ra), float(dec), radius, mag_limit)
+            else:
+                nside, hp_to_search = _cone(float(ra), float(dec), radius)
+                xyz, mag = catalog.select(hp_to_search, nside, mag_limit)
+            budget = chart_star_budget()
+            if len(mag) > budget:
+                # too many stars, keep only the brightest, and tighten the magnitude limit to match
+                xyz, mag, mag_limit = _brightest(xyz, mag, ra, dec, radius, budget, mag_limit)
+            scale, offset = _diameter_mapping(mag_limit)
+            return scale * mag / 1000.0 + offset, xyz, scale, offset
+
+
+def _diameter_mapping(mag_limit):
+    "Returns scale, offset giving the svg circle diameter = scale * magnitude + offset for a chart with this magnitude limit"
+    scale = 0.0505*mag_limit -1.2726          # these map scale/offset to the cutoff magnitude of the chart
+    offset = 0.3667*mag_limit + 3.6543        # constants found by emperical observation of what looks nice
+    return scale, offset
+
+
+def _brightest(xyz, mag, ra, dec, radius, budget, mag_limit):
+    """Given star unit vectors xyz and magnitudes mag in thousandths of a magnitude, returns xyz, mag, mag_limit
+       for no more than budget of the brightest stars within radius degrees of ra, dec, and mag_limit
+       the magnitude limit of those stars, which is never more than the given mag_limit"""
+    # the healpix pixels searched extend beyond the chart, so first drop stars outside it
+    xyz, mag = _in_cone(xyz, mag, ra, dec, radius)
+    if len(mag) <= budget:
+        return xyz, mag, mag_limit
+    # a partial sort, placing the magnitude of the first star not wanted at position budget
+    cutoff = np.partition(mag, budget)[budget]
+    wanted = mag < cutoff
+    return xyz[wanted], mag[wanted], min(float(cutoff) / 1000.0, mag_limit)
+
+
+def _in_cone(xyz, mag, ra, dec, radius):
+    "Returns xyz, mag for the stars within radius degrees of ra, dec"
+    centre = _unit_vectors(np.array([float(ra)]), np.array([float(dec)]))[0]
+    inside = xyz @ centre >= math.cos(math.radians(radius))
+    return xyz[inside], mag[inside]
+
+
+def _level(radius):
+    "Returns nside, HEALPix object of the finest level of detail whose pixels are no smaller than radius"
+    for nside, hpobject, pixelsize in _LEVELS:
+        if pixelsize >= radius:
+            return nside, hpobject
+    return nside, hpobject
+
+
+def _cone(ra, dec, radius):
+    """Returns nside, pixels where pixels is an array of the nested healpix pixels of the given nside
+       within radius degrees of ra, dec, searched at the level of detail suited to the radius"""
+    nside, hpobject = _level(radius)
+    return nside, _cone_pixels(nside, ra, dec, radius)
+
+
+def _cone_pixels(nside, ra, dec, radius):
+    """Returns a read only array of the nested healpix pixels of the given nside within radius degrees
+       of ra, dec, given as floats. The centre is rounded to a fraction of the pixel size, and the radius
+       enlarged to cover the rounding, so a few pixels beyond the cone may be included, but the
+       search is cached and shared by every chart centred within the same rounding"""
+    pixelsize = _NSIDES[nside][1]
+    quantum = pixelsize * _CONE_QUANTUM
+    radius += pixelsize * _CONE_MARGIN
+    # the rounded centre is within half a quantum in ra and dec, so less than a quantum away
+    return _cone_search(nside, round(ra / quantum), round(dec / quantum), math.ceil(radius / quantum) + 1)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cone_search(nside, ra_index, dec_index, radius_index):
+    "The cached cone search of _cone_pixels, with centre and radius given as multiples of the quantum"
+    hpobject, pixelsize = _NSIDES[nside]
+    quantum = pixelsize * _CONE_QUANTUM
+    ra = ra_index * quantum
+    dec = min(max(dec_index * quantum, -90.0), 90.0)
+    pixels = np.asarray(hpobject.cone_search_lonlat(ra * u.deg, dec * u.deg, radius=radius_index * quantum * u.deg), dtype=np.int64)
+    # the cached array is shared between callers, so must not be altered
+    pixels.flags.writeable = False
+    return pixels
+
+
+def cone_cache_info():
+    "Returns the cone search cache statistics, a named tuple of hits, misses, maxsize, currsize"
+    return _cone_search.cache_info()
+
+
+# When a chart needs at least catalog_fanout_pixels() pixels read from the catalog, and catalog_threads() is set,
+# they are read concurrently by this pool of threads, numpy copying from the memory mapped files, and sqlite,
+# both release the GIL while waiting on the disc. With the catalog already in the page cache the reads are
+# too short for the threads to help, so the pool is off by default; on a host with slow storage, run
+# astrodata/benchcatalog.py to find the crossover, and set catalog_threads and catalog_fanout_pixels in cfg.py
+_FANOUT_PIXELS = catalog_fanout_pixels()
+
+if catalog_threads():
+    _POOL = ThreadPoolExecutor(max_workers=catalog_threads(), thread_name_prefix="catalog")
+else:
+    _POOL = None
+
+
+def _fanout(function, pixels):
+    "Returns a list of function(pixel) for each of the given pixels, called concurrently if there are enough of them"
+    if (_POOL is None) or (len(pixels) < _FANOUT_PIXELS):
+        return [function(pixel) for pixel in pixels]
+    return list(_POOL.map(function, pixels))
+
+
+class StarCatalog(object):
+    """The memory mapped columnar star catalog, as made by astrodata/builddb.py"""
+
+    def __init__(self):
+        "Maps the columnar files, raises OSError if they are not available"
+        for column in _COLUMNS:
+            setattr(self, column, np.load(os.path.join(starcatalogs, f"GSC_{column}.npy"), mmap_mode='r'))
+
+    def select(self, hp_to_search, nside, mag_limit):
+        """Returns xyz, mag arrays, with mag in thousandths of a magnitude, for stars
+           in the given healpix pixels of the given nside which are brighter than mag_limit"""
+        limit = int(round(mag_limit * 1000))
+        return _cached_tiles(hp_to_search, nside, limit, lambda hp: self._read([hp], nside, limit))
+
+    def _read(self, hp_to_search, nside, limit):
+        """Reads xyz, mag arrays from the mapped files for stars in the given healpix pixels
+           of the given nside which are brighter than limit, given in thousandths of a magnitude"""
+        # each pixel of the given nside is a run of k catalog pixels
+        k = (_CATALOG_NSIDE // nside) ** 2
+        pixels = (np.asarray(hp_to_search, dtype=np.int64)[:, None] * k + np.arange(k)).ravel()
+        starts = self.index[pixels]
+        # the first breakpoint at or above the limit
+        j = int(np.searchsorted(self.breakmags, limit))
+        if j < len(self.breakmags):
+            stops = self.breaks[pixels, j]
+        else:
+            stops = self.index[pixels+1]
+        rows = _runs(starts, stops)
+        xyz = self.xyz[rows]
+        mag = self.mag[rows]
+        if (j == len(self.breakmags)) or (self.breakmags[j] != limit):
+            # the limit is not a breakpoint, so remove the stars between the limit and the breakpoint
+            wanted = mag < limit
+            return xyz[wanted], mag[wanted]
+        return xyz, mag
+
+
+class LRUCache(object):
+    """A thread safe least recently used cache, bounded by the total size of the values held,
+       where size(value) gives the size of each value, by default one, so bounding the number of entries"""
+
+    def __init__(self, maxsize, size=None):
+        self.maxsize = maxsize
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._sizeof = size if size is not None else (lambda value: 1)
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        "Returns the value of the given key, or None if it is not cached"
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                self.misses += 1
+                return
+            self._values.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        "Adds a value to the cache, evicting the least recently used values to keep within maxsize"
+        size = self._sizeof(value)
+        if size > self.maxsize:
+            return
+        with self._lock:
+            if key in self._values:
+                self.size -= self._sizeof(self._values.pop(key))
+            self._values[key] = value
+            self.size += size
+            while self.size > self.maxsize:
+                oldkey, oldvalue = self._values.popitem(last=False)
+                self.size -= self._sizeof(oldvalue)
+
+    def info(self):
+        "Returns a dictionary of cache statistics"
+        with self._lock:
+            return {'entries':len(self._values), 'size':self.size, 'maxsize':self.maxsize, 'hits':self.hits, 'misses':self.misses}
+
+
+def _tile_bytes(tile):
+    "Returns the bytes held by a star tile, a tuple of numpy arrays"
+    return sum(column.nbytes for column in tile)
+
+
+# the star tile cache, keyed by (nside, healpix pixel, magnitude limit), bounded by the bytes held
+# and shared by all waitress worker threads
+_TILES = LRUCache(star_cache_bytes(), _tile_bytes)
+
+
+def _cached_tiles(hp_to_search, nside, limit, read):
+    """Returns xyz, mag arrays for stars in the given healpix pixels of the given nside which are brighter
+       than limit, in thousandths of a magnitude, taking each pixel from the tile cache, or if it is not
+       cached, from read(pixel), which returns the xyz, mag tile of a single pixel"""
+    tiles = []
+    misses = []
+    for hp in hp_to_search:
+        tile = _TILES.get((nside, int(hp), limit))
+        if tile is None:
+            misses.append(int(hp))
         else:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP = {hp_to_search[0]} and MAG < {mag_limit}" )
-        result = cur.fetchall()
-    finally:
-        con.close()
-    return result, mag_scale, mag_offset
+            tiles.append(tile)
+    # read the pixels not in the cache, concurrently if there are enough of them
+    for hp, tile in zip(misses, _fanout(read, misses)):
+        for column in tile:
+            # tiles are shared between callers, so must not be altered
+            column.flags.writeable = False
+        _TILES.put((nside, hp, limit), tile)
+        tiles.append(tile)
+    if len(tiles) == 1:
+        return tiles[0]
+    if not tiles:
+        return np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=np.int16)
+    return tuple(np.concatenate(column) for column in zip(*tiles))
+
+
+def star_cache_info():
+    "Returns a dictionary of star tile cache statistics, with keys entries, size, maxsize, hits, misses, where size is in bytes"
+    return _TILES.info()
+
+
+def _runs(starts, stops):
+    "Returns an array of the row numbers in each run starts[i] to stops[i]"
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    # each row is its run start, plus its position within the run
+    return np.arange(total) + np.repeat(starts - (ends - lengths), lengths)
+
+
+def _star_catalog():
+    "Returns the StarCatalog, or None if it is not available"
+    if 'GSC' not in _CATALOG:
+        try:
+            _CATALOG['GSC'] = StarCatalog()
+        except (OSError, ValueError):
+            _CATALOG['GSC'] = None
+    return _CATALOG['GSC']
+
+
+# catalog access layer for the older sqlite databases, each waitress worker thread keeps its
+# own read-only connection to each database open, rather than connecting on every query
+
+# bytes of each catalog file to memory map, the HP768 catalog is the largest
+_MMAP_SIZE = 1073741824
+
+# each connection caches this many prepared statements
+_CACHED_STATEMENTS = 64
+
+# a single parameterised statement, so sqlite prepares it once per connection
+# and then finds it in the statement cache for every subsequent pixel
+_STAR_QUERY = "select MAG, RA, DEC from stars where HP = ? and MAG < ?"
+
+_catalog_connections = threading.local()
+
+
+def _catalog_connection(catalog):
+    """Returns this thread's read-only connection to the given catalog database path,
+       opening it on the first call"""
+    connections = getattr(_catalog_connections, 'connections', None)
+    if connections is None:
+        connections = {}
+        _catalog_connections.connections = connections
+    con = connections.get(catalog)
+    if con is None:
+        # the catalogs never change while the server is running, so immutable mode
+        # lets sqlite skip file locking and change detection
+        uri = pathlib.Path(catalog).as_uri() + "?mode=ro&immutable=1"
+        con = sqlite3.connect(uri, uri=True, cached_statements=_CACHED_STATEMENTS)
+        con.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
+        connections[catalog] = con
+    return con
+
+
+def _read_database(catalog, hp, mag_limit):
+    """Returns xyz, mag arrays, as the columnar catalog gives them, with mag in thousandths of a magnitude,
+       for stars in the given healpix pixel of the catalog database brighter than mag_limit"""
+    stars = np.array(_catalog_connection(catalog).execute(_STAR_QUERY, (hp, mag_limit)).fetchall(), dtype=float).reshape(-1, 3)
+    xyz = _unit_vectors(stars[:, 1], stars[:, 2]).astype(np.float32)
+    mag = np.rint(stars[:, 0] * 1000).astype(np.int16)
+    return xyz, mag
+
+
+def _database_stars(ra, dec, radius, mag_limit):
+    """Returns xyz, mag arrays, with mag in thousandths of a magnitude, for stars within radius of ra, dec
+       brighter than mag_limit, read from the older sqlite database holding stars to that limit.
+       Each pixel read is held in the star tile cache, as the pixels of the columnar catalog are"""
+    if mag_limit <= 6.0:
+        catalog, nside = _HP48, 2
+    elif mag_limit <= 9.0:
+        catalog, nside = _HP192, 4
+    else:
+        catalog, nside = _HP768, 8
+    hp_to_search = _cone_pixels(nside, ra, dec, radius)
+    limit = int(round(mag_limit * 1000))
+    return _cached_tiles(hp_to_search, nside, limit, lambda hp: _read_database(catalog, hp, mag_limit))
 
 
 
-def q2( ra, dec, view, mag_scale, mag_offset, mag_limit):
-    """Get stars from the _HP192 database brighter than the mag_limit"""
-    radius = view/2.0
-    hp_to_search = tuple(_hp192.cone_search_skycoord(SkyCoord(ra=ra*u.deg, dec=dec*u.deg), radius=radius * u.deg))
-    try:
-        con = sqlite3.connect(_HP192, detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        if len(hp_to_search) > 1:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP in {hp_to_search} and MAG < {mag_limit}" )
-        else:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP = {hp_to_search[0]} and MAG < {mag_limit}" )
-        result = cur.fetchall()
-    finally:
-        con.close()
-    return result, mag_scale, mag_offset
+# Views wide enough to have a magnitude limit no fainter than _BRIGHT_LIMIT draw only the few thousand
+# stars of the bright layer, which is held in memory by each process, about 80KB, so these views
+# are answered by a vectorised mask over the whole sky, without any catalog reads
+_BRIGHT_LIMIT = 6.0
 
+# holds the bright layer once loaded, a tuple (xyz, mag) sorted by magnitude, or None if no catalog is available
+_BRIGHT = {}
 
-def q3(ra, dec, view, mag_scale, mag_offset, mag_limit):
-    """Get stars from the _HP768 database limited by magnitude"""
-    radius = view/2.0
-    hp_to_search = tuple(_hp768.cone_search_skycoord(SkyCoord(ra=ra*u.deg, dec=dec*u.deg), radius=radius * u.deg))
-    try:
-        con = sqlite3.connect(_HP768, detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        if len(hp_to_search) > 1:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP in {hp_to_search} and MAG < {mag_limit}" )
+
+def _bright_stars():
+    """Returns a tuple of numpy arrays (xyz, mag), with mag in thousandths of a magnitude, for all stars
+       brighter than _BRIGHT_LIMIT sorted by magnitude, or None if the star catalog is not available"""
+    if 'stars' not in _BRIGHT:
+        limit = int(round(_BRIGHT_LIMIT * 1000))
+        catalog = _star_catalog()
+        if catalog is not None:
+            # the twelve pixels of nside 1 are the whole sky
+            xyz, mag = catalog._read(range(12), 1, limit)
         else:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP = {hp_to_search[0]} and MAG < {mag_limit}" )
-        result = cur.fetchall()
-    finally:
-        con.close()
-    return result, mag_scale, mag_offset
+            try:
+                uri = pathlib.Path(_HP48).as_uri() + "?mode=ro&immutable=1"
+                con = sqlite3.connect(uri, uri=True)
+                try:
+                    stars = np.array(con.execute("select MAG, RA, DEC from stars where MAG < ?", (_BRIGHT_LIMIT,)).fetchall(), dtype=float).reshape(-1, 3)
+                finally:
+                    con.close()
+            except sqlite3.Error:
+                _BRIGHT['stars'] = None
+                return
+            xyz = _unit_vectors(stars[:, 1], stars[:, 2])
+            mag = np.rint(stars[:, 0] * 1000).astype(np.int16)
+        order = np.argsort(mag, kind='stable')
+        xyz = np.ascontiguousarray(xyz[order])
+        mag = np.ascontiguousarray(mag[order])
+        xyz.flags.writeable = False
+        mag.flags.writeable = False
+        _BRIGHT['stars'] = (xyz, mag)
+    return _BRIGHT['stars']
+
+
+
+# global dictionary views, used to define the magnitude limit
+# the chart will show with a given view in degrees
+
+
+       # degrees       magnitude
+       # of view       limit
+
+
+views = {   110 :      4.0,
+             60 :      5.0,
+             40 :      6.0,
+             25 :      7.0,
+             15 :      8.0,
+              5 :      9.0,
+              3 :     10.0,
+              2 :     11.0,
+            1.5 :     12.0,
+            1.0 :     13.0,
+            0.7 :     13.5,
+            0.6 :     13.9,
+            0.5 :     14.3,
+            0.4 :     14.6,
+            0.3 :     14.8,
+              0 :     15.0
+        }
 
 
+# holds the constellation lines once loaded, as a tuple (start_dec, end_dec, start_xyz, end_xyz, index)
+# the lines are sorted by the nside 128 nested healpix pixel of their start, and the lines starting in
+# pixel p are rows index[p] to index[p+1], so as with the star catalog, the lines starting in a pixel
+# of any coarser nside are a single run of rows
+_LINES = {}
 
-def q4(ra, dec, view, mag_scale, mag_offset, mag_limit):
-    """Get stars from the _HP768 database not limited by magnitude"""
-    radius = view/2.0
-    hp_to_search = tuple(_hp768.cone_search_skycoord(SkyCoord(ra=ra*u.deg, dec=dec*u.deg), radius=radius * u.deg))
-    try:
-        con = sqlite3.connect(_HP768, detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-        if len(hp_to_search) > 1:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP in {hp_to_search} and MAG < {mag_limit}" )
-        else:
-            cur.execute( f"select {mag_scale}*MAG + {mag_offset}, RA, DEC from stars where HP = {hp_to_search[0]} and MAG < {mag_limit}" )
-        result = cur.fetchall()
-    finally:
-        con.close()
-    return result, mag_scale, mag_offset
-
-
-
-# global dictionary views, used to define which query function to call
-# given the view in degrees, and the magnitude limit the
-# chart will show with that view
-
-
-       # degrees         query    magnitude
-       # of view       function   limit
-
-
-views = {   110 :      ( q1,    4.0 ),
-             60 :      ( q1,    5.0 ),
-             40 :      ( q1,    6.0 ),
-             25 :      ( q2,    7.0 ),
-             15 :      ( q2,    8.0 ),
-              5 :      ( q2,    9.0 ),
-              3 :      ( q3,   10.0 ),
-              2 :      ( q3,   11.0 ),
-            1.5 :      ( q3,   12.0 ),
-            1.0 :      ( q3,   13.0 ),
-            0.7 :      ( q3,   13.5 ),
-            0.6 :      ( q3,   13.9 ),
-            0.5 :      ( q3,   14.3 ),
-            0.4 :      ( q3,   14.6 ),
-            0.3 :      ( q3,   14.8 ),
-              0 :      ( q4,   15.0 )
-        }
+# for wider views, a large part of the sky is visible and all lines are tested without the index
+_LINES_INDEX_RADIUS = 20.0
 
 
-def xy_constellation_lines(ra, dec, view):
-    "Generator returning lines as x,y values rather than ra, dec values"
-    lines = get_constellation_lines()
-    if not lines:
-        return
+def _unit_vectors(ra_deg, dec_deg):
+    "Returns an (N,3) array of the Cartesian unit vectors of the given ra, dec arrays in degrees"
+    ra_rad = np.radians(ra_deg)
+    dec_rad = np.radians(dec_deg)
+    cosdec = np.cos(dec_rad)
+    return np.column_stack((cosdec * np.cos(ra_rad), cosdec * np.sin(ra_rad), np.sin(dec_rad)))
+
+
+def _constellation_lines():
+    """Returns the constellation lines as a tuple of arrays (start_dec, end_dec, start_xyz, end_xyz, index)
+       with declinations in degrees, the line ends as Cartesian unit vectors, and index the offsets
+       of the lines starting in each nside 128 healpix pixel. These are calculated from the
+       constellation lines csv file on the first call"""
+    if 'lines' not in _LINES:
+        lines = np.array(get_constellation_lines(), dtype=float).reshape(-1, 4)
+        # something wrong with a line if its ra is out of range, do not plot these
+        valid = np.all((lines[:, 0::2] >= 0.0) & (lines[:, 0::2] <= 360.0), axis=1)
+        lines = lines[valid]
+        hpobject = _LEVELS[0][1]
+        hp = hpobject.lonlat_to_healpix(lines[:, 0] * u.deg, lines[:, 1] * u.deg)
+        order = np.argsort(hp, kind='stable')
+        lines = lines[order]
+        index = np.searchsorted(hp[order], np.arange(hpobject.npix + 1)).astype(np.int64)
+        _LINES['lines'] = (lines[:, 1], lines[:, 3], _unit_vectors(lines[:, 0], lines[:, 1]), _unit_vectors(lines[:, 2], lines[:, 3]), index)
+    return _LINES['lines']
+
+
+def _chart_frame(ra, dec, view):
+    """Returns ra0, dec0, min_dec, max_dec, scale, radius for a chart centred on ra, dec with the given view,
+       with ra0, dec0 the limited centre, min_dec, max_dec the declination range and radius half the
+       limited view, all in degrees"""
 
     # limit centre of the chart
     ra0_deg = float(ra)
     if (ra0_deg < 0.0) or (ra0_deg > 360.0):
         ra0_deg = 0.0
-    ra0 = math.radians(ra0_deg)
 
     dec0_deg = float(dec)
     if dec0_deg > 90.0:
         dec0_deg = 90.0
     if dec0_deg < -90.0:
         dec0_deg = -90.0
-    dec0 = math.radians(dec0_deg)
 
     view_deg = float(view)
 
@@ -193,208 +546,293 @@ def xy_constellation_lines(ra, dec, view):
     if view_deg > 270.0:
         view_deg = 270.0
 
-    max_dec = dec0_deg + view_deg / 2.0
-    if max_dec > 90.0:
-        max_dec = 90.0
-
-    min_dec = dec0_deg - view_deg / 2.0
-    if min_dec < -90.0:
-        min_dec = -90.0
+    max_dec = min(dec0_deg + view_deg / 2.0, 90.0)
+    min_dec = max(dec0_deg - view_deg / 2.0, -90.0)
 
     scale = 500 / math.radians(view_deg)
 
-    cosdec0 = math.cos(dec0)
-    sindec0 = math.sin(dec0)
+    return ra0_deg, dec0_deg, min_dec, max_dec, scale, view_deg / 2.0
 
-    for line in lines:
 
-        start_ra_deg = float(line[0])
-        start_dec_deg = float(line[1])
-        end_ra_deg = float(line[2])
-        end_dec_deg = float(line[3])
+def _rotation(ra0, dec0):
+    """Returns the 3x3 matrix which rotates Cartesian unit vectors to the frame of a chart centred
+       on ra0, dec0 in degrees, with the x axis to the east, y to the north and z to the chart centre"""
+    ra0 = math.radians(ra0)
+    dec0 = math.radians(dec0)
+    sinra0, cosra0 = math.sin(ra0), math.cos(ra0)
+    sindec0, cosdec0 = math.sin(dec0), math.cos(dec0)
+    return np.array(((-sinra0, cosra0, 0.0),
+                     (-sindec0 * cosra0, -sindec0 * sinra0, cosdec0),
+                     (cosdec0 * cosra0, cosdec0 * sinra0, sindec0)))
 
-        if (start_ra_deg < 0.0) or (start_ra_deg > 360.0) or (end_ra_deg < 0.0) or (end_ra_deg > 360.0):
-            # something wrong, do not plot this line
-            continue
 
-        # don't draw line if either start or end declination is outside required view
-        # unfortunately ra is more complicated
-        if start_dec_deg > max_dec:
-            continue
-        if start_dec_deg < min_dec:
-            continue
-        if end_dec_deg > max_dec:
-            continue
-        if end_dec_deg < min_dec:
-            continue
+def _project(vectors, rotation, scale):
+    """Stereographic projection of an (N,3) array of unit vectors, returns arrays x, y of chart positions
+       algorithm taken from www.projectpluto.com/project.htm"""
+    x1, y1, z1 = rotation @ vectors.T
+    d = np.where(z1 < -0.9, 20.0 * np.sqrt(0.19 / (1.00001 - z1 * z1)), 2.0 / (z1 + 1.0)) * scale
+    return x1 * d, y1 * d
 
-        # start of line
-        ra_rad = math.radians(start_ra_deg)
-        dec_rad = math.radians(start_dec_deg)
-        delta_ra = ra_rad - ra0
-        sindec = math.sin(dec_rad)
-        cosdec = math.cos(dec_rad)
-        cosdelta_ra = math.cos(delta_ra)
-
-        x1 = cosdec * math.sin(delta_ra);
-        y1 = sindec * cosdec0 - cosdec * cosdelta_ra * sindec0
-        z1 = sindec * sindec0 + cosdec * cosdec0 * cosdelta_ra
-        if z1 < -0.9:
-           d = 20.0 * math.sqrt(( 1.0 - 0.81) / ( 1.00001 - z1 * z1))
-        else:
-           d = 2.0 / (z1 + 1.0)
-        x1 = x1 * d * scale
-        y1 = y1 * d * scale
 
-        if x1*x1 + y1*y1 > 62500:
-            # line start position is outside the circle
-            continue
+def xy_constellation_lines(ra, dec, view):
+    "Returns a numpy array of lines, with rows of [x1,y1,x2,y2] values rather than ra, dec values"
+    start_dec, end_dec, start_xyz, end_xyz, index = _constellation_lines()
+    if not len(start_dec):
+        return np.empty((0, 4))
 
-        # end of line
-        ra_rad = math.radians(end_ra_deg)
-        dec_rad = math.radians(end_dec_deg)
-        delta_ra = ra_rad - ra0
-        sindec = math.sin(dec_rad)
-        cosdec = math.cos(dec_rad)
-        cosdelta_ra = math.cos(delta_ra)
-
-        x2 = cosdec * math.sin(delta_ra);
-        y2 = sindec * cosdec0 - cosdec * cosdelta_ra * sindec0
-        z2 = sindec * sindec0 + cosdec * cosdec0 * cosdelta_ra
-        if z2 < -0.9:
-           d = 20.0 * math.sqrt(( 1.0 - 0.81) / ( 1.00001 - z2 * z2))
-        else:
-           d = 2.0 / (z2 + 1.0)
-        x2 = x2 * d * scale
-        y2 = y2 * d * scale
+    ra0, dec0, min_dec, max_dec, scale, radius = _chart_frame(ra, dec, view)
+
+    if radius <= _LINES_INDEX_RADIUS:
+        # a line is only drawn if both its ends are inside the chart circle, which lies within
+        # a cone of half the view about the chart centre, so only the lines starting in the healpix
+        # pixels of this cone need be considered, being the same pixels searched for the chart stars
+        nside, hp_to_search = _cone(ra0, dec0, radius)
+        k = (_CATALOG_NSIDE // nside) ** 2
+        rows = _runs(index[hp_to_search * k], index[(hp_to_search + 1) * k])
+        start_dec, end_dec, start_xyz, end_xyz = start_dec[rows], end_dec[rows], start_xyz[rows], end_xyz[rows]
+
+    # don't draw line if either start or end declination is outside required view
+    # unfortunately ra is more complicated
+    wanted = (start_dec <= max_dec) & (start_dec >= min_dec) & (end_dec <= max_dec) & (end_dec >= min_dec)
+
+    rotation = _rotation(ra0, dec0)
+    x1, y1 = _project(start_xyz[wanted], rotation, scale)
+    x2, y2 = _project(end_xyz[wanted], rotation, scale)
+
+    # don't draw line if either end is outside the circle
+    inside = (x1*x1 + y1*y1 <= 62500) & (x2*x2 + y2*y2 <= 62500)
+    return np.column_stack((x1[inside], y1[inside], x2[inside], y2[inside]))
+
+
+# holds the planet positions once read from the planet database, as a tuple (mtime, table, segments) where mtime
+# is the modification time of the database file when read, the daily cron job rewriting the database
+# changes its modification time, and the positions are then read again
+_EPHEMERIS = {}
+
+_EPHEMERIS_LOCK = threading.Lock()
+
+# the bodies with positions in the planet database
+_BODIES = ('moon', 'mercury', 'venus', 'mars', 'jupiter', 'saturn', 'uranus', 'neptune', 'pluto')
+
+
+def _ephemeris():
+    """Returns a tuple (table, segments) read from the planet database if it has changed since it was last read.
+       table is a dictionary of planet name to (times, ra, dec) numpy arrays of the POSITIONS table, times being
+       seconds since the epoch in ascending order, and segments is a dictionary of planet name to (starts, spans, coeffs)
+       numpy arrays of the CHEBYSHEV table, of segment start times in ascending order and lengths in seconds,
+       and coefficients with shape (segments, 3, degree+1)"""
+    planetdb = get_planetdb()
+    try:
+        mtime = os.stat(planetdb).st_mtime_ns
+    except OSError:
+        return {}, {}
+    current = _EPHEMERIS.get('current')
+    if (current is not None) and (current[0] == mtime):
+        return current[1:]
+    with _EPHEMERIS_LOCK:
+        current = _EPHEMERIS.get('current')
+        if (current is not None) and (current[0] == mtime):
+            return current[1:]
+        try:
+            uri = pathlib.Path(planetdb).as_uri() + "?mode=ro"
+            con = sqlite3.connect(uri, uri=True)
+            try:
+                rows = con.execute("SELECT NAME, DATEANDTIME, RA, DEC FROM POSITIONS ORDER BY NAME, DATEANDTIME").fetchall()
+                try:
+                    segment_rows = con.execute("SELECT NAME, START, SECONDS, COEFFS FROM CHEBYSHEV ORDER BY NAME, START").fetchall()
+                except sqlite3.OperationalError:
+                    # a database made before the segments were added
+                    segment_rows = []
+            finally:
+                con.close()
+        except sqlite3.Error:
+            # possibly mid way through being rebuilt, keep any positions already read, and try again next call
+            return ({}, {}) if current is None else current[1:]
+        table = {}
+        for name, (times, ra, dec) in _runs_by_name(rows).items():
+            table[name] = (np.array(times, dtype='datetime64[s]').astype(np.int64), np.array(ra, dtype=float), np.array(dec, dtype=float))
+        segments = {}
+        for name, (starts, spans, coeffs) in _runs_by_name(segment_rows).items():
+            coeffs = np.array([np.frombuffer(blob, dtype=np.float64) for blob in coeffs]).reshape(len(coeffs), 3, -1)
+            segments[name] = (np.array(starts, dtype='datetime64[s]').astype(np.int64), np.array(spans, dtype=float), coeffs)
+        _EPHEMERIS['current'] = (mtime, table, segments)
+        return table, segments
+
+
+def _runs_by_name(rows):
+    """Given rows ordered by name, each a tuple (name, value, value...), returns a dictionary of name to
+       a tuple of the value columns of that name's rows"""
+    result = {}
+    if rows:
+        names = [row[0] for row in rows]
+        firsts = [index for index in range(len(names)) if (not index) or (names[index] != names[index-1])]
+        for start, stop in zip(firsts, firsts[1:] + [len(names)]):
+            result[names[start]] = tuple(zip(*rows[start:stop]))[1:]
+    return result
+
+
+def _segment_coefficients(segments, name, t):
+    """Returns (coeffs, tau) for the named body at times t, a numpy array of seconds since the epoch, where coeffs
+       has shape (len(t), 3, degree+1) and tau is each time's position in its segment, from -1 to 1,
+       or None if the body's segments do not cover the times"""
+    if name not in segments:
+        return
+    starts, spans, coeffs = segments[name]
+    i = np.searchsorted(starts, t, side='right') - 1
+    if (i < 0).any():
+        return
+    tau = 2.0 * (t - starts[i]) / spans[i] - 1.0
+    if (tau > 1.0).any():
+        return
+    return coeffs[i], tau
+
+
+def _chebyshev(coeffs, tau):
+    "Returns an array of shape (3, len(tau)) of the x, y, z coordinates given by _segment_coefficients"
+    # the Chebyshev polynomials are T_k(tau) = cos(k arccos(tau)), so are evaluated without a recurrence
+    basis = np.cos(np.arange(coeffs.shape[2])[:, None] * np.arccos(tau))
+    return np.einsum('kn,nck->cn', basis, coeffs)
+
+
+def _segment_xyz(segments, name, t):
+    """Returns an array of shape (3, len(t)) of the x, y, z coordinates in AU of the named body at times t,
+       a numpy array of seconds since the epoch, evaluated from its segments, or None if they do not cover the times"""
+    found = _segment_coefficients(segments, name, t)
+    if found is not None:
+        return _chebyshev(*found)
 
-        if x2*x2 + y2*y2 > 62500:
-            # line end position is outside the circle
-            continue
 
-        yield (x1,y1,x2,y2)
+def _at_observatory(astro_centre):
+    "Returns True if astro_centre is the observatory, for which the planet database positions are calculated"
+    if 'observatory' not in _EPHEMERIS:
+        longitude, latitude, elevation = observatory()
+        _EPHEMERIS['observatory'] = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    return all(abs((a - b).to_value(u.m)) < 1.0 for a, b in zip(astro_centre.geocentric, _EPHEMERIS['observatory'].geocentric))
+
+
+def _get_body(name, time, astro_centre):
+    """Returns get_body(name, time, astro_centre), a SkyCoord in the GCRS frame of the observer, where time is an
+       astropy Time, possibly array valued. If the planet database segments cover the time, the position is
+       evaluated from them, rather than calculated from the ephemeris"""
+    if _at_observatory(astro_centre):
+        table, segments = _ephemeris()
+        xyz = _segment_xyz(segments, name, np.atleast_1d(time.unix))
+        if xyz is not None:
+            if time.isscalar:
+                xyz = xyz[:, 0]
+            obsgeoloc, obsgeovel = astro_centre.get_gcrs_posvel(time)
+            frame = GCRS(obstime=time, obsgeoloc=obsgeoloc, obsgeovel=obsgeovel)
+            return SkyCoord(CartesianRepresentation(xyz*u.au), frame=frame)
+    return get_body(name, time, astro_centre)
+
+
+def get_planet_position(name, thisdate_time):
+    """Returns (ra, dec, alt, az) in degrees of the named body at the observatory at thisdate_time, a naive UTC datetime,
+       evaluated from the planet database segments, or None if the segments do not cover the time"""
+    table, segments = _ephemeris()
+    t = np.array([thisdate_time.replace(tzinfo=timezone.utc).timestamp()])
+    if _segment_xyz(segments, name, t) is None:
+        return
+    longitude, latitude, elevation = observatory()
+    astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
+    time = Time(thisdate_time, format='datetime', scale='utc')
+    target = _get_body(name, time, astro_centre)
+    target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
+    return target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree
 
 
 def get_planets(thisdate_time, dec, view, scale, const):
     """Get planet positions for the given datetime for drawing on the chart
 
-       Reads the planet positions from the database, which are set at hourly intervals
-       (on the half hour mark) and interpolates the planet position for the requested time"""
-    global _PLANETS
+       Evaluates the planet positions from the polynomial segments in the planet database, or for any planet
+       not covered by the segments, reads the positions set at regular intervals, hourly on the half hour mark
+       unless astrodata/make_planets.py sets a finer cadence for a body, and interpolates the planet position
+       for the requested time. The database is held in memory by _ephemeris(), and the positions of all
+       planets are interpolated together"""
     # dec is the declination of the centre of the chart, and 
     # view is the diameter of the chart, so defines the maximum and minimum declination to draw
     # if any planet is outside this declination range, it is not required for the chart
 
-    planets = []
+    table, segments = _ephemeris()
+    if not (table or segments):
+        return []
+
     max_dec = dec + view/2.0
     min_dec = dec - view/2.0
 
-    # The database holds planet positions for 30 minutes past the hour, so get the nearest time position
-    dateandtime = datetime(thisdate_time.year, thisdate_time.month, thisdate_time.day, thisdate_time.hour) + timedelta(minutes=30)
-
-    # get halfhour time before the requested time (dateminus)
-    # and halfhour time after the requested time (dateplus)
+    # the requested time as seconds since the epoch, thisdate_time being a naive UTC datetime
+    t = thisdate_time.replace(tzinfo=timezone.utc).timestamp()
+
+    # for each planet with segments, its svg diameter, and (coeffs, tau) at the requested time
+    evaluated = []
+    found = []
+    # for each other planet, its svg diameter, and the positions at or before the requested time (minus)
+    # and after the requested time (plus)
+    diameters = []
+    minus = []
+    plus = []
+    for name,mag in _PLANETS.items():
+        # get the svg diameter of the planet
+        d = scale*mag + const
+        if d>9:
+            # set a maximum diameter
+            d = 9
+        if d<0.1:
+            # however, if less than .1, don't bother
+            continue
+        segment = _segment_coefficients(segments, name, np.array([t]))
+        if segment is not None:
+            evaluated.append(d)
+            found.append(segment)
+            continue
+        if name not in table:
+            continue
+        times, ra, declination = table[name]
+        # the index of the first position after the requested time
+        i = int(np.searchsorted(times, t, side='right'))
+        if (i == 0) or (i == len(times)):
+            # the requested time is not within the positions held
+            continue
+        diameters.append(d)
+        minus.append((times[i-1], ra[i-1], declination[i-1]))
+        plus.append((times[i], ra[i], declination[i]))
 
-    if dateandtime > thisdate_time:
-        dateplus = dateandtime
-        dateminus = dateandtime - timedelta(hours=1)
-    else:
-        dateminus = dateandtime
-        dateplus = dateandtime + timedelta(hours=1)
+    if diameters:
+        time_m, ra_m, dec_m = np.array(minus).T
+        time_p, ra_p, dec_p = np.array(plus).T
 
-    # thisdate_time lies between dateminus and dateplus
+        # position = position_at_minus + (position_at_plus - position_at_minus) * fraction of the interval passed
+        fraction = (t - time_m) / (time_p - time_m)
 
-    # seconds from dateminus
-    secfromdateminus = thisdate_time - dateminus
+        # interpolate actual declination
+        declination = dec_m + (dec_p - dec_m) * fraction
 
-    secs = secfromdateminus.total_seconds()
+        # interpolation of ra is more complicated due to the 0-360 discontinuity, where the span
+        # crosses the 360 to 0 boundary, for example ra_m = 359, ra_p = 1, the span of -358 becomes 2
+        span = ra_p - ra_m
+        span = np.where(span >= 180, span - 360, np.where(span <= -180, span + 360, span))
+        ra = np.mod(ra_m + span * fraction, 360)
+    else:
+        ra = declination = np.empty(0)
 
-    # for an interval of 60 minutes, which is 3600 seconds
-    # position = position_at_dateminus + (position_at_dateplus - position_at_dateminus) * secs/3600
+    if evaluated:
+        # evaluate the polynomials of all these planets together
+        coeffs, tau = zip(*found)
+        x, y, z = _chebyshev(np.concatenate(coeffs), np.concatenate(tau))
+        diameters = evaluated + diameters
+        ra = np.concatenate((np.mod(np.degrees(np.arctan2(y, x)), 360), ra))
+        declination = np.concatenate((np.degrees(np.arctan2(z, np.hypot(x, y))), declination))
 
-    # database connection
-    con = None
-    try:
-        con = sqlite3.connect(get_planetdb(), detect_types=sqlite3.PARSE_DECLTYPES)
-        cur = con.cursor()
-
-        for name,mag in _PLANETS.items():
-            # get the svg diameter of the planet
-            d = scale*mag + const
-            if d>9:
-                # set a maximum diameter
-                d = 9
-            if d<0.1:
-                # however, if less than .1, don't bother
-                continue
-            # For dateminus and dateplus, read the database
-            cur.execute('SELECT RA,DEC FROM POSITIONS WHERE DATEANDTIME=? AND NAME=?', (dateminus, name))
-            planet_minus = cur.fetchone()
-            if not planet_minus:
-                continue
-            cur.execute('SELECT RA,DEC FROM POSITIONS WHERE DATEANDTIME=? AND NAME=?', (dateplus, name))
-            planet_plus = cur.fetchone()
-            if not planet_plus:
-                continue
-
-            dec_m = planet_minus[1]
-            dec_p = planet_plus[1]
-
-            # interpolate actual declination
-            declination = dec_m + (dec_p - dec_m) * secs/3600
-            # don't bother if outside the max and min dec range - will not appear on the chart
-            if declination > max_dec:
-                continue
-            if declination < min_dec:
-                continue
-
-            # interpolation of ra is more complicated due to the 0-360 discontinuity
-            ra_m = planet_minus[0]
-            ra_p = planet_plus[0]
-
-            span = ra_p - ra_m
-
-            if abs(span)<180:
-                # The discontinuity is not spanned, so all ok
-                ra = ra_m + span * secs/3600
-                planets.append((d, ra, declination))
-                continue
-
-            # The span crosses the 360 to 0 boundary
-            if span > 0:
-                # for example ra_p = 359
-                #             ra_m = 1
-                #             span = 358
-                # so make ra_p a negative number ( ra_p - 360), example, ra_p becomes -1 
-                # and interpolation becomes 1 + (-1-1)*sec/3600  giving a value between 1 (when sec is 0) and -1 (when sec is 3600)
-                ra_p = ra_p-360
-            else:
-                # for example ra_p = 1
-                #             ra_m = 359
-                #             span = -358
-                # so make ra_m a negative number ( ra_m - 360), example, ra_m becomes -1
-                # and interpolation becomes -1 + (1 - (-1))*sec/3600  giving a value between -1 (when sec is 0) and 1 (when sec is 3600)
-                ra_m = ra_m-360
-
-            ra = ra_m + (ra_p - ra_m) * secs/3600
-            # if ra is negative, make final ra positive again by ra + 360
-            if ra<0:
-                ra += 360
-            planets.append((d, ra, declination))
-
-    except:
+    if not diameters:
         return []
-    finally:
-        if con:
-            con.close()
 
-    if not planets:
+    # don't bother if outside the max and min dec range - will not appear on the chart
+    wanted = (declination <= max_dec) & (declination >= min_dec)
+    if not wanted.any():
         return []
-
-    return planets
+    return list(zip(np.array(diameters)[wanted].tolist(), ra[wanted].tolist(), declination[wanted].tolist()))
   
   
-
 def get_named_object(target_name, tstamp, astro_centre=None):
     """Return eq_coord, altaz_coord
        where these are SkyCoord objects
@@ -416,19 +854,15 @@ def get_named_object(target_name, tstamp, astro_centre=None):
 
     target_name_lower = target_name.lower()
 
-    if target_name_lower in ('moon', 'mercury', 'venus', 'mars', 'jupiter', 'saturn', 'uranus', 'neptune', 'pluto'):
-        target = get_body(target_name_lower, tstamp, astro_centre)
+    if target_name_lower in _BODIES:
+        target = _get_body(target_name_lower, tstamp, astro_centre)
         # target in GCRS geocentric frame
         target_altaz = target.transform_to(AltAz(obstime = tstamp, location = astro_centre))
         return  target, target_altaz
 
     # not a planet, see if it is something like M45 or star name, this obtains an icrs framed object
-    try:
-        target = SkyCoord.from_name(target_name)
-    except name_resolve.NameResolveError:
-        # failed to find name, maybe a minor planet
-        pass
-    else:
+    target = names.resolve(target_name)
+    if target is not None:
         target_altaz = target.transform_to(AltAz(obstime = tstamp, location = astro_centre))
         return  target, target_altaz
 
@@ -447,6 +881,17 @@ def get_named_object(target_name, tstamp, astro_centre=None):
 
 
 
+def _series(datetimes, target, target_altaz, target_pg=None):
+    """Returns a list of lists [datetime, ra, dec, alt, az] in degrees, or with target_pg given, [datetime, ra, dec, alt, az, ra(pg), dec(pg)]
+       one for each of the datetimes, where target, target_altaz and target_pg are the positions at each datetime, or
+       for a fixed object, target may be a single position"""
+    columns = [target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree]
+    if target_pg is not None:
+        columns.extend((target_pg.ra.degree, target_pg.dec.degree))
+    columns = [np.broadcast_to(column, (len(datetimes),)).tolist() for column in columns]
+    return [list(row) for row in zip(datetimes, *columns)]
+
+
 def get_named_object_slots(target_name, thedate, astro_centre=None):
     """Return a list of lists of [ datetime, ra, dec, alt, az] in degrees for the given thedate (a datetime or date object)
        return None if not found, where each list is the position at the mid time of each night slot of thedate"""
@@ -461,46 +906,34 @@ def get_named_object_slots(target_name, thedate, astro_centre=None):
     slots = night_slots(thedate)
     midtimes = [ slot.midtime for slot in slots ]
 
-    result_list = []
+    # all the mid times as a single array valued Time, so each frame is calculated with one transform
+    times = Time(midtimes, format='datetime', scale='utc')
 
     # Test if planet
     target_name_lower = target_name.lower()
 
-    if target_name_lower in ('moon', 'mercury', 'venus', 'mars', 'jupiter', 'saturn', 'uranus', 'neptune', 'pluto'):
+    if target_name_lower in _BODIES:
         # Its a planet
-        for mt in midtimes:
-            time = Time(mt, format='datetime', scale='utc')
-            target = get_body(target_name_lower, time, astro_centre)
-            # target in GCRS frame
-            target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
-            result_list.append([mt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree])
-        return result_list
+        target = _get_body(target_name_lower, times, astro_centre)
+        # target in GCRS frame
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+        return _series(midtimes, target, target_altaz)
 
     # Test if a fixed object, such as M45 - RA, DEC's will be constant, though alt, az will change
-    try:
-        target = SkyCoord.from_name(target_name)
-    except name_resolve.NameResolveError:
-        # failed to find name, maybe a minor planet
-        pass
-    else:
-        for mt in midtimes:
-            time = Time(mt, format='datetime', scale='utc')
-            target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
-            result_list.append([mt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree])
-        return result_list
+    target = names.resolve(target_name)
+    if target is not None:
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+        return _series(midtimes, target, target_altaz)
 
     # Test if minor planet/comet
-    time = Time(midtimes[0], format='datetime', scale='utc')
     try:
-        eph = MPC.get_ephemeris(target_name, step="1hour", start=time, number=len(midtimes))
-        for idx, mt in enumerate(midtimes):
-            target = SkyCoord(eph['RA'][idx]*u.degree, eph['Dec'][idx]*u.degree, frame='icrs')
-            target_altaz = target.transform_to(AltAz(obstime = mt, location = astro_centre))
-            result_list.append([mt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree])
+        eph = MPC.get_ephemeris(target_name, step="1hour", start=times[0], number=len(midtimes))
+        target = SkyCoord(np.asarray(eph['RA'][:len(midtimes)])*u.degree, np.asarray(eph['Dec'][:len(midtimes)])*u.degree, frame='icrs')
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
     except InvalidQueryError:
         return
 
-    return result_list
+    return _series(midtimes, target, target_altaz)
 
 
 
@@ -518,8 +951,6 @@ def get_unnamed_object_slots(target_ra, target_dec, thedate, astro_centre=None):
     slots = night_slots(thedate)
     midtimes = [ slot.midtime for slot in slots ]
 
-    result_list = []
-
     # RA, DEC's will be constant, though alt, az will change
     try:
         if isinstance(target_ra, float) or isinstance(target_ra, int):
@@ -527,15 +958,12 @@ def get_unnamed_object_slots(target_ra, target_dec, thedate, astro_centre=None):
         if isinstance(target_dec, float) or isinstance(target_dec, int):
              target_dec = target_dec*u.deg
         target = SkyCoord(target_ra, target_dec, frame='icrs')
-        for mt in midtimes:
-            time = Time(mt, format='datetime', scale='utc')
-            target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
-            result_list.append([mt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree])
+        times = Time(midtimes, format='datetime', scale='utc')
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+        return _series(midtimes, target, target_altaz)
     except Exception:
         return
 
-    return result_list
-
 
 
 def get_named_object_intervals(target_name, start, step, number, astro_centre=None):
@@ -551,44 +979,30 @@ def get_named_object_intervals(target_name, start, step, number, astro_centre=No
         longitude, latitude, elevation = observatory()
         astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
-    times = []
-    for dt in range(number):
-        times.append(start)
-        start = start + step
+    datetimes = [start + step*n for n in range(number)]
 
-    result_list = []
+    # all the times as a single array valued Time, so each frame is calculated with one transform
+    times = Time(datetimes, format='datetime', scale='utc')
 
     # Test if planet
     target_name_lower = target_name.lower()
 
-    if target_name_lower in ('moon', 'mercury', 'venus', 'mars', 'jupiter', 'saturn', 'uranus', 'neptune', 'pluto'):
+    if target_name_lower in _BODIES:
         # Its a planet
-        for dt in times:
-            time = Time(dt, format='datetime', scale='utc')
-            target = get_body(target_name_lower, time, astro_centre)
-            # target in GCRS frame
-            target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
-            target_pg = target.transform_to(PrecessedGeocentric(obstime = time, equinox = time))
-            result_list.append([dt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree, target_pg.ra.degree, target_pg.dec.degree])
-        return result_list
+        target = _get_body(target_name_lower, times, astro_centre)
+        # target in GCRS frame
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+        target_pg = target.transform_to(PrecessedGeocentric(obstime = times, equinox = times))
+        return _series(datetimes, target, target_altaz, target_pg)
 
     # Test if a fixed object, such as M45 - RA, DEC's will be constant, though alt, az will change
-    try:
-        target = SkyCoord.from_name(target_name)
-    except name_resolve.NameResolveError:
-        # failed to find name, maybe a minor planet
-        pass
-    else:
-        for dt in times:
-            time = Time(dt, format='datetime', scale='utc')
-            target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
-            target_pg = target.transform_to(PrecessedGeocentric(obstime = time, equinox = time))
-            result_list.append([dt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree, target_pg.ra.degree, target_pg.dec.degree])
-        return result_list
+    target = names.resolve(target_name)
+    if target is not None:
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+        target_pg = target.transform_to(PrecessedGeocentric(obstime = times, equinox = times))
+        return _series(datetimes, target, target_altaz, target_pg)
 
     # Test if minor planet/comet
-    time = Time(times[0], format='datetime', scale='utc')
-    
     seconds = step.total_seconds()
     if seconds < 60:
         stepstring = str(seconds) + "second"
@@ -598,16 +1012,14 @@ def get_named_object_intervals(target_name, start, step, number, astro_centre=No
         stepstring = str(seconds//3600) + "hour"
 
     try:
-        eph = MPC.get_ephemeris(target_name, step=stepstring, start=time, number=number)
-        for idx, dt in enumerate(times):
-            target = SkyCoord(eph['RA'][idx]*u.degree, eph['Dec'][idx]*u.degree, frame='icrs')
-            target_altaz = target.transform_to(AltAz(obstime = dt, location = astro_centre))
-            target_pg = target.transform_to(PrecessedGeocentric(obstime = dt, equinox = dt))
-            result_list.append([dt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree, target_pg.ra.degree, target_pg.dec.degree])
+        eph = MPC.get_ephemeris(target_name, step=stepstring, start=times[0], number=number)
+        target = SkyCoord(np.asarray(eph['RA'][:number])*u.degree, np.asarray(eph['Dec'][:number])*u.degree, frame='icrs')
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+        target_pg = target.transform_to(PrecessedGeocentric(obstime = times, equinox = times))
     except InvalidQueryError:
         return
 
-    return result_list
+    return _series(datetimes, target, target_altaz, target_pg)
 
 
 def get_unnamed_object_intervals(target_ra, target_dec, start, step, number, astro_centre=None):
@@ -622,12 +1034,7 @@ def get_unnamed_object_intervals(target_ra, target_dec, start, step, number, ast
         longitude, latitude, elevation = observatory()
         astro_centre = EarthLocation.from_geodetic(longitude, latitude, elevation)
 
-    times = []
-    for dt in range(number):
-        times.append(start)
-        start = start + step
-
-    result_list = []
+    datetimes = [start + step*n for n in range(number)]
 
     try:
         if isinstance(target_ra, float) or isinstance(target_ra, int):
@@ -635,86 +1042,134 @@ def get_unnamed_object_intervals(target_ra, target_dec, start, step, number, ast
         if isinstance(target_dec, float) or isinstance(target_dec, int):
              target_dec = target_dec*u.deg
         target = SkyCoord(target_ra, target_dec, frame='icrs')
-        for dt in times:
-            time = Time(dt, format='datetime', scale='utc')
-            target_altaz = target.transform_to(AltAz(obstime = time, location = astro_centre))
-            target_pg = target.transform_to(PrecessedGeocentric(obstime = time, equinox = time))
-            result_list.append([dt, target.ra.degree, target.dec.degree, target_altaz.alt.degree, target_altaz.az.degree, target_pg.ra.degree, target_pg.dec.degree])
+        times = Time(datetimes, format='datetime', scale='utc')
+        target_altaz = target.transform_to(AltAz(obstime = times, location = astro_centre))
+        target_pg = target.transform_to(PrecessedGeocentric(obstime = times, equinox = times))
+        return _series(datetimes, target, target_altaz, target_pg)
     except Exception:
         return
 
-    return result_list
 
+def chartpositions(diameters, xyz, ra, dec, view):
+    """Convert each star position to an x, y position for the star chart, diameters is a numpy array
+       of star diameters, and xyz a numpy array with a row of Cartesian unit vector (x, y, z) for each star.
+       Returns a numpy array with a row [d, x, y] for each star within the chart"""
 
-def chartpositions(stars, ra, dec, view):
-    "Convert each star position to an x, y position for the star chart"
+    ra0, dec0, min_dec, max_dec, scale, radius = _chart_frame(ra, dec, view)
 
-    # limit centre of the chart
-    ra0_deg = float(ra)
-    if (ra0_deg < 0.0) or (ra0_deg > 360.0):
-        ra0_deg = 0.0
-    ra0 = math.radians(ra0_deg)
+    # stereographic algorithm, as a rotation to the chart frame
+    x, y = _project(xyz, _rotation(ra0, dec0), scale)
 
-    dec0_deg = float(dec)
-    if dec0_deg > 90.0:
-        dec0_deg = 90.0
-    if dec0_deg < -90.0:
-        dec0_deg = -90.0
-    dec0 = math.radians(dec0_deg)
+    # z is the sine of the declination, so this tests the declination is within the view
+    # and the star must also lie inside the chart circle
+    z = xyz[:, 2]
+    wanted = (z <= math.sin(math.radians(max_dec))) & (z >= math.sin(math.radians(min_dec))) & (x*x + y*y <= 62500)
+    return np.column_stack((diameters[wanted], x[wanted], y[wanted]))
 
-    view_deg = float(view)
 
-    # avoid division by zero
-    if view_deg < 0.000001:
-        view_deg = 0.00001
 
-    # avoid extra wide angle
-    if view_deg > 270.0:
-        view_deg = 270.0
+# The finished star chart payloads are cached, keyed by the chart centre quantised to a fraction
+# of the view, the view, and the time quantised to the planet interval. Each server process
+# holds recent payloads in memory, and all payloads are also saved in redis, so they are
+# shared between the waitress workers of every server process
 
-    max_dec = dec0_deg + view_deg / 2.0
-    if max_dec > 90.0:
-        max_dec = 90.0
+# the chart centre is rounded to this fraction of the view, the chart is 500 pixels across
+# so this moves the chart by no more than a quarter of a pixel
+_CENTRE_QUANTUM = 1.0/1000.0
 
-    min_dec = dec0_deg - view_deg / 2.0
-    if min_dec < -90.0:
-        min_dec = -90.0
+# a generous maximum rate of planet motion, in degrees per hour, used to choose the time
+# interval within which planet positions move less than a pixel of the chart
+_PLANET_RATE = 0.1
 
-    scale = 500 / math.radians(view_deg)
 
-    cosdec0 = math.cos(dec0)
-    sindec0 = math.sin(dec0)
+# the chart payload cache, bounded by the number of entries, and shared by all waitress worker threads
+_PAYLOADS = LRUCache(chart_cache_entries())
 
-    # stereographic algorithm
-    # taken from www.projectpluto.com/project.htm
 
-    starlist = list([float(star[0]), float(star[1]), float(star[2])] for star in stars)
-    stararray = np.array(starlist)
-    test1 = np.logical_or( (stararray[:,1] < 0.0), (stararray[:,1] > 360.0) )
-    test2 = np.logical_or( (stararray[:,2] > max_dec), (stararray[:,2] < min_dec) )
-    test = np.logical_or(test1, test2)
-    stararray = np.delete(stararray, test, axis=0)
+def chart_cache_info():
+    "Returns a dictionary of chart payload cache statistics, with keys entries, size, maxsize, hits, misses"
+    return _PAYLOADS.info()
 
-    ra_rad = np.radians(stararray[:, 1])    # ra in radians
-    dec_rad = np.radians(stararray[:, 2])   # dec in radians
 
-    delta_ra = ra_rad - ra0   # ra in radians, with ra0 subtracted from each element
+def _planet_interval(view):
+    "Returns the interval in seconds, dividing the hour, over which planets move less than a pixel of a chart of the given view"
+    for interval in (3600, 900, 300):
+        if _PLANET_RATE * interval / 3600.0 <= view / 500.0:
+            return interval
+    return 60
 
-    sindec = np.sin(dec_rad)
-    cosdec = np.cos(dec_rad)
-    cosdelta_ra = np.cos(delta_ra)
 
-    x1 = cosdec * np.sin(delta_ra);
-    y1 = sindec * cosdec0 - cosdec * cosdelta_ra * sindec0
-    z1 = sindec * sindec0 + cosdec * cosdec0 * cosdelta_ra
+def chart_time(view, thisdate_time):
+    """Returns thisdate_time rounded down to the planet interval of the view, charts drawn at
+       any time within the same interval are identical"""
+    interval = _planet_interval(float(view))
+    hour = thisdate_time.replace(minute=0, second=0, microsecond=0)
+    seconds = (thisdate_time - hour).total_seconds() // interval * interval
+    return hour + timedelta(seconds=seconds)
+
+
+def _chart_key(ra, dec, view, thisdate_time):
+    """Returns key, ra, dec, thisdate_time where ra, dec and thisdate_time are quantised,
+       and key is a string identifying the chart drawn with these values"""
+    quantum = max(float(view), 0.001) * _CENTRE_QUANTUM
+    ra_index = round(float(ra) / quantum)
+    dec_index = round(float(dec) / quantum)
+    thisdate_time = chart_time(view, thisdate_time)
+    key = f"chart_{ra_index}_{dec_index}_{float(view)}_{thisdate_time.strftime('%Y%m%d%H%M')}"
+    return key, ra_index * quantum, dec_index * quantum, thisdate_time
+
+
+def _compact(values, diameters=False):
+    """Returns the numpy array of chart values as a list of lists for the json payload, with values
+       rounded to chart_decimals places, so the short repr of each float is sent rather than all its digits.
+       If diameters is True, the first column is star diameters, which are given one more decimal place
+       so the faintest stars do not round to nothing"""
+    decimals = chart_decimals()
+    if decimals is None:
+        return values.tolist()
+    rounded = np.round(values, decimals)
+    if diameters:
+        rounded[:, 0] = np.round(values[:, 0], decimals + 1)
+    return rounded.tolist()
+
+
+def chart_payload(ra, dec, view, thisdate_time, prefix='', rconn=None):
+    """Returns a dictionary with keys 'lines', 'stars' of the constellation lines and the stars and planets
+       as x, y positions for a chart centred on ra, dec with the given view at thisdate_time.
+       Lines are only given for views wider than ten degrees, otherwise the lines value is an empty list.
+       The payload is taken from the cache if available, and must not be altered"""
+    key, ra, dec, thisdate_time = _chart_key(ra, dec, view, thisdate_time)
+    payload = _PAYLOADS.get(key)
+    if payload is not None:
+        return payload
+    payload = redis_ops.get_chart_payload(key, prefix, rconn)
+    if payload is not None:
+        _PAYLOADS.put(key, payload)
+        return payload
+
+    if view>10.0:
+        lines = _compact(xy_constellation_lines(ra, dec, view))
+    else:
+        lines = []
+
+    diameters, xyz, scale, const = get_stars(ra, dec, view)
+
+    # the planets database are created at 30 minutes past the hour, so get the planets for this hour
+    planets = get_planets(thisdate_time, dec, view, scale, const)
+
+    if planets:
+        planets = np.array(planets, dtype=float)
+        diameters = np.concatenate((diameters, planets[:, 0]))
+        xyz = np.concatenate((xyz, _unit_vectors(planets[:, 1], planets[:, 2])))
 
-    d = np.where(z1 < -0.9, 20.0 * np.sqrt(0.19 / ( 1.00001 - z1 * z1)), 2.0 / (z1 + 1.0))
-    x = x1 * d * scale
-    y = y1 * d * scale
+    # convert stars to xy positions on the chart
+    payload = {'lines':lines, 'stars':_compact(chartpositions(diameters, xyz, ra, dec, view), diameters=True)}
 
-    stackarray = np.column_stack((stararray[:, 0],x,y))
-    stackarray = np.delete(stackarray, np.where((x*x + y*y)>62500), axis=0)
-    return stackarray.tolist()
+    _PAYLOADS.put(key, payload)
+    redis_ops.set_chart_payload(key, payload, prefix, rconn)
+    return payload
 
 
 
+# load the bright stars as each server process starts, rather than on its first wide chart
+_bright_stars()
@@ -0,0 +1,117 @@
+"""Compares remscope_packages.coords against astropy over a grid of dates and positions,
+failing if the engine drifts beyond its documented accuracy. Run from the project directory
+
+python3 -m pytest tests"""
+
+import os, sys
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import astropy.units as u
+from astropy.coordinates import SkyCoord, EarthLocation, AltAz, PrecessedGeocentric, GCRS
+from astropy.time import Time
+from astropy.utils import iers
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from remscope_packages import coords
+from remscope_packages.cfg import observatory
+
+# use the IERS tables bundled with astropy, the later dates are beyond them, and are compared
+# with UT1 taken as UTC, as coords does
+iers.conf.auto_download = False
+iers.conf.iers_degraded_accuracy = 'ignore'
+
+# dates beyond the IERS tables and leap second table give warnings on each transform
+pytestmark = [pytest.mark.filterwarnings("ignore::astropy.utils.exceptions.AstropyWarning"),
+              pytest.mark.filterwarnings("ignore::erfa.ErfaWarning")]
+
+# the largest differences allowed, in arcseconds
+ALTAZ = 12.0
+REFRACTED = 20.0
+PRECESSED = 2.0
+OFFSET = 0.01
+
+# dates from 2000 to 2040, at different times of day and year
+DATES = [datetime(year, month, 11, hour, 23, 17) for year in range(2000, 2041, 8) for month, hour in ((1, 1), (4, 7), (7, 13), (10, 19))]
+
+LONGITUDE, LATITUDE, ELEVATION = observatory()
+ASTRO_CENTRE = EarthLocation.from_geodetic(LONGITUDE, LATITUDE, ELEVATION)
+
+_ra, _dec = np.meshgrid(np.arange(0.0, 360.0, 15.0), np.arange(-80.0, 90.0, 10.0))
+RA = _ra.ravel()
+DEC = _dec.ravel()
+
+
+def separation(ra1, dec1, ra2, dec2):
+    "Returns the angle in arcseconds between positions, in degrees"
+    cosine = np.sum(coords._unit_vector(ra1, dec1) * coords._unit_vector(ra2, dec2), axis=0)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0))) * 3600.0
+
+
+@pytest.mark.parametrize("dt", DATES)
+def test_icrs_to_altaz(dt):
+    tstamp = Time(dt, format='datetime', scale='utc')
+    target_altaz = SkyCoord(RA*u.deg, DEC*u.deg, frame='icrs').transform_to(AltAz(obstime=tstamp, location=ASTRO_CENTRE))
+    alt, az = coords.icrs_to_altaz(RA, DEC, dt, LONGITUDE, LATITUDE)
+    # only positions above the horizon are compared
+    up = target_altaz.alt.degree > 0.0
+    assert separation(az, alt, target_altaz.az.degree, target_altaz.alt.degree)[up].max() < ALTAZ
+
+
+@pytest.mark.parametrize("dt", DATES)
+def test_icrs_to_altaz_refracted(dt):
+    tstamp = Time(dt, format='datetime', scale='utc')
+    frame = AltAz(obstime=tstamp, location=ASTRO_CENTRE, pressure=1010*u.hPa, temperature=10*u.deg_C, relative_humidity=0, obswl=0.55*u.micron)
+    refracted = SkyCoord(RA*u.deg, DEC*u.deg, frame='icrs').transform_to(frame)
+    alt, az = coords.icrs_to_altaz(RA, DEC, dt, LONGITUDE, LATITUDE, pressure=1010.0, temperature=10.0)
+    # refraction formulae differ close to the horizon
+    high = refracted.alt.degree > 10.0
+    assert separation(az, alt, refracted.az.degree, refracted.alt.degree)[high].max() < REFRACTED
+
+
+@pytest.mark.parametrize("dt", DATES)
+def test_altaz_to_icrs(dt):
+    tstamp = Time(dt, format='datetime', scale='utc')
+    target_altaz = SkyCoord(RA*u.deg, DEC*u.deg, frame='icrs').transform_to(AltAz(obstime=tstamp, location=ASTRO_CENTRE))
+    back = SkyCoord(alt=target_altaz.alt, az=target_altaz.az, obstime=tstamp, location=ASTRO_CENTRE, frame='altaz').transform_to('icrs')
+    ra, dec = coords.altaz_to_icrs(target_altaz.alt.degree, target_altaz.az.degree, dt, LONGITUDE, LATITUDE)
+    up = target_altaz.alt.degree > 0.0
+    assert separation(ra, dec, back.ra.degree, back.dec.degree)[up].max() < ALTAZ
+
+
+@pytest.mark.parametrize("dt", DATES)
+def test_precessed(dt):
+    tstamp = Time(dt, format='datetime', scale='utc')
+    target_pg = SkyCoord(RA*u.deg, DEC*u.deg, frame='icrs').transform_to(PrecessedGeocentric(obstime=tstamp, equinox=tstamp))
+    ra, dec = coords.icrs_to_precessed(RA, DEC, dt)
+    assert separation(ra, dec, target_pg.ra.degree, target_pg.dec.degree).max() < PRECESSED
+    ra, dec = coords.precessed_to_icrs(target_pg.ra.degree, target_pg.dec.degree, dt)
+    assert separation(ra, dec, RA, DEC).max() < PRECESSED
+
+
+@pytest.mark.parametrize("dt", DATES)
+def test_gcrs(dt):
+    "The aberration=False path, for geocentric positions, as the planets and the telescope are given"
+    tstamp = Time(dt, format='datetime', scale='utc')
+    target_gcrs = SkyCoord(RA*u.deg, DEC*u.deg, frame=GCRS(obstime=tstamp))
+    gcrs_altaz = target_gcrs.transform_to(AltAz(obstime=tstamp, location=ASTRO_CENTRE))
+    alt, az = coords.icrs_to_altaz(RA, DEC, dt, LONGITUDE, LATITUDE, aberration=False)
+    up = gcrs_altaz.alt.degree > 0.0
+    assert separation(az, alt, gcrs_altaz.az.degree, gcrs_altaz.alt.degree)[up].max() < ALTAZ
+    # and a GCRS position given as precessed ra, dec, as the telescope reports it
+    target_pg = target_gcrs.transform_to(PrecessedGeocentric(obstime=tstamp, equinox=tstamp))
+    ra, dec = coords.precessed_to_icrs(target_pg.ra.degree, target_pg.dec.degree, dt, aberration=False)
+    assert separation(ra, dec, RA, DEC).max() < PRECESSED
+
+
+def test_offset_by():
+    target = SkyCoord(RA*u.deg, DEC*u.deg, frame='icrs')
+    moved = target.directional_offset_by(37.0*u.deg, 2.5*u.deg)
+    ra, dec = coords.offset_by(RA, DEC, 37.0, 2.5)
+    assert separation(ra, dec, moved.ra.degree, moved.dec.degree).max() < OFFSET
+    back = moved.position_angle(target).degree
+    difference = np.abs(coords.position_angle(moved.ra.degree, moved.dec.degree, RA, DEC) - back)
+    assert np.minimum(difference, 360.0 - difference).max() * 3600.0 < OFFSET